@@ -1,14 +1,151 @@
 """配置加载模块"""
 import os
+import sys
+import json
+import mmap
 import yaml
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from loguru import logger
 
+# 优先使用 libyaml 的 C 解析器，未编译 libyaml 时回退到纯 Python 实现
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
 # 加载 .env 文件
 load_dotenv()
 
+# 导入时读取一次环境变量，load_config 重复调用时直接复用
+_DERIBIT_CLIENT_ID = os.getenv("DERIBIT_CLIENT_ID", "")
+_DERIBIT_CLIENT_SECRET = os.getenv("DERIBIT_CLIENT_SECRET", "")
+_DERIBIT_BASE_URL = os.getenv("DERIBIT_BASE_URL")
+_FEISHU_WEBHOOK_URL = os.getenv("FEISHU_WEBHOOK_URL", "")
+
+
+_NUMBER = {"type": "number"}
+
+# 配置结构 JSON Schema（在环境变量合并之后校验）
+_CONFIG_SCHEMA = {
+    "type": "object",
+    "required": ["deribit", "feishu"],
+    "properties": {
+        "general": {
+            "type": "object",
+            "properties": {
+                "poll_interval_seconds": {"type": "number", "exclusiveMinimum": 0},
+                "log_level": {
+                    "type": "string",
+                    "enum": ["TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL"]
+                },
+                "state_compress": {"type": "boolean"}
+            }
+        },
+        "deribit": {
+            "type": "object",
+            "required": ["client_id", "client_secret", "base_url"],
+            "properties": {
+                "client_id": {"type": "string"},
+                "client_secret": {"type": "string"},
+                "base_url": {"type": "string", "minLength": 1},
+                "underlying": {"type": "string"},
+                "trust_position_greeks": {"type": "boolean"},
+                "batch_requests": {"type": "boolean"}
+            }
+        },
+        "feishu": {
+            "type": "object",
+            "required": ["webhook_url"],
+            "properties": {"webhook_url": {"type": "string"}}
+        },
+        "option_greeks_thresholds": {
+            "type": "object",
+            "additionalProperties": {"type": "object", "additionalProperties": _NUMBER}
+        },
+        "dvol_thresholds": {
+            "type": "object",
+            "properties": {
+                "dvol_value": {
+                    "type": "object",
+                    "properties": {
+                        "abs_threshold": _NUMBER,
+                        "pct_change_5m": _NUMBER,
+                        "abs_change_5m": _NUMBER,
+                        "specific_values": {"type": "array", "items": _NUMBER},
+                        "specific_value_tolerance": _NUMBER
+                    }
+                }
+            }
+        },
+        "alert": {
+            "type": "object",
+            "properties": {
+                "enable_alert": {"type": "boolean"},
+                "cooldown_seconds": {"type": "number", "minimum": 0}
+            }
+        }
+    }
+}
+
+# 当前已配置的日志级别，None 表示尚未由 load_config 配置
+_current_log_level: Optional[str] = None
+
+# 导入时编译一次校验函数，未安装 fastjsonschema 时跳过结构校验
+_validate_config = fastjsonschema.compile(_CONFIG_SCHEMA) if fastjsonschema is not None else None
+
+
+def _load_yaml_cached(config_file: Path) -> Dict[str, Any]:
+    """
+    读取 YAML 配置，使用以 mtime+size 为键的 JSON 缓存文件加速
+    
+    缓存只保存 YAML 原始内容，环境变量在加载后再覆盖，
+    因此更换凭证不需要让缓存失效。
+    
+    Args:
+        config_file: 配置文件路径
+        
+    Returns:
+        YAML 解析后的配置字典
+    """
+    stat = config_file.stat()
+    cache_file = config_file.with_suffix(".cache.json")
+    
+    if cache_file.exists():
+        try:
+            cached = json.loads(cache_file.read_text(encoding="utf-8"))
+            if cached.get("mtime") == stat.st_mtime and cached.get("size") == stat.st_size:
+                return cached["config"]
+        except Exception as e:
+            logger.debug(f"配置缓存读取失败，重新解析 YAML: {e}")
+    
+    logger.debug(f"使用 YAML 解析器: {SafeLoader.__name__}")
+    # 通过 mmap 直接把原始字节交给解析器，省去一次文本解码（mmap 不支持空文件）
+    if stat.st_size > 0:
+        with open(config_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            config = yaml.load(mm, Loader=SafeLoader) or {}
+    else:
+        config = {}
+    
+    # 原子写入缓存文件，写入失败不影响正常加载
+    try:
+        tmp_file = cache_file.with_suffix(".tmp")
+        tmp_file.write_text(
+            json.dumps({"mtime": stat.st_mtime, "size": stat.st_size, "config": config}, ensure_ascii=False),
+            encoding="utf-8"
+        )
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        logger.debug(f"写入配置缓存失败: {e}")
+    
+    return config
+
 
 def load_config(config_path: str = "config.yaml") -> Dict[str, Any]:
     """
@@ -25,26 +162,39 @@ def load_config(config_path: str = "config.yaml") -> Dict[str, Any]:
     if not config_file.exists():
         raise FileNotFoundError(f"配置文件不存在: {config_path}")
     
-    with open(config_file, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
+    config = _load_yaml_cached(config_file)
     
     # 从环境变量加载敏感信息
     # 确保 deribit 配置节存在
     if "deribit" not in config:
         config["deribit"] = {}
     
-    config["deribit"]["client_id"] = os.getenv("DERIBIT_CLIENT_ID", "")
-    config["deribit"]["client_secret"] = os.getenv("DERIBIT_CLIENT_SECRET", "")
-    config["deribit"]["base_url"] = os.getenv(
-        "DERIBIT_BASE_URL", 
-        config.get("deribit", {}).get("base_url", "https://www.deribit.com")
+    config["deribit"]["client_id"] = _DERIBIT_CLIENT_ID
+    config["deribit"]["client_secret"] = _DERIBIT_CLIENT_SECRET
+    config["deribit"]["base_url"] = _DERIBIT_BASE_URL or config["deribit"].get(
+        "base_url", "https://www.deribit.com"
     )
     
     # 确保 feishu 配置节存在
     if "feishu" not in config:
         config["feishu"] = {}
     
-    config["feishu"]["webhook_url"] = os.getenv("FEISHU_WEBHOOK_URL", "")
+    config["feishu"]["webhook_url"] = _FEISHU_WEBHOOK_URL
+    
+    # 日志级别不区分大小写，校验前统一为大写（loguru 只接受大写级别名）
+    general = config.get("general")
+    if isinstance(general, dict) and isinstance(general.get("log_level"), str):
+        general["log_level"] = general["log_level"].upper()
+    
+    # 校验配置结构
+    if _validate_config is None:
+        logger.warning("未安装 fastjsonschema，跳过配置结构校验")
+    else:
+        try:
+            _validate_config(config)
+        except fastjsonschema.JsonSchemaException as e:
+            logger.error(f"配置文件格式错误 ({e.name}): {e.message}")
+            raise
     
     # 验证必要的配置项
     if not config["deribit"]["client_id"] or not config["deribit"]["client_secret"]:
@@ -53,14 +203,19 @@ def load_config(config_path: str = "config.yaml") -> Dict[str, Any]:
     if not config["feishu"]["webhook_url"]:
         logger.warning("飞书 Webhook URL 未设置，告警功能将不可用")
     
-    # 设置日志级别
+    # 设置日志级别（级别未变化时保留现有 handler，避免重复加载配置时丢失日志）
+    global _current_log_level
     log_level = config.get("general", {}).get("log_level", "INFO")
+    if log_level == _current_log_level:
+        return config
+    
     logger.remove()
     logger.add(
-        lambda msg: print(msg, end=""),
+        sys.stderr,
         level=log_level,
         format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan> - <level>{message}</level>"
     )
+    _current_log_level = log_level
     
     return config
 
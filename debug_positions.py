@@ -1,7 +1,6 @@
 """调试脚本 - 查看期权持仓的原始数据"""
 import os
 import sys
-import json
 from dotenv import load_dotenv
 from loguru import logger
 
@@ -10,12 +9,12 @@ load_dotenv()
 
 # 导入项目模块
 from config import load_config
-from deribit_client import DeribitClient
+from deribit_client import DeribitClient, format_json
 
 # 配置日志
 logger.remove()
 logger.add(
-    lambda msg: print(msg, end=""),
+    sys.stderr,
     level="DEBUG",  # 使用 DEBUG 级别查看详细信息
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>"
 )
@@ -82,34 +81,39 @@ def debug_positions():
             logger.info("")
             
             # 显示每个持仓的详细信息
+            info = logger.info
             for i, pos in enumerate(btc_positions, 1):
-                logger.info(f"\n[{i}] 持仓详情:")
-                logger.info(f"  合约名称: {pos.get('instrument_name', 'N/A')}")
-                logger.info(f"  持仓量: {pos.get('size', 0)}")
-                logger.info(f"  方向: {pos.get('size', 0) > 0 and 'BUY' or 'SELL'}")
-                logger.info("")
-                logger.info("  原始数据（完整 JSON）:")
-                logger.info(json.dumps(pos, indent=2, ensure_ascii=False))
-                logger.info("")
-                logger.info("  Greeks 数据:")
-                greeks = pos.get("greeks", {})
+                get = pos.get
+                size = get("size", 0)
+                greeks = get("greeks") or {}
+                greeks_get = greeks.get
+                
+                info(f"\n[{i}] 持仓详情:")
+                info(f"  合约名称: {get('instrument_name', 'N/A')}")
+                info(f"  持仓量: {size}")
+                info(f"  方向: {size > 0 and 'BUY' or 'SELL'}")
+                info("")
+                info("  原始数据（完整 JSON）:")
+                info(format_json(pos))
+                info("")
+                info("  Greeks 数据:")
                 if greeks:
-                    logger.info(json.dumps(greeks, indent=2, ensure_ascii=False))
+                    info(format_json(greeks))
                 else:
                     logger.warning("  Greeks 数据为空或不存在")
-                logger.info("")
-                logger.info("  提取的关键字段:")
-                logger.info(f"    mark_iv: {pos.get('mark_iv', 'N/A')}")
-                logger.info(f"    greeks.gamma: {greeks.get('gamma', 'N/A') if greeks else 'N/A'}")
-                logger.info(f"    greeks.delta: {greeks.get('delta', 'N/A') if greeks else 'N/A'}")
-                logger.info(f"    greeks.theta: {greeks.get('theta', 'N/A') if greeks else 'N/A'}")
-                logger.info(f"    greeks.vega: {greeks.get('vega', 'N/A') if greeks else 'N/A'}")
-                logger.info("")
-                logger.info("  所有可用字段:")
+                info("")
+                info("  提取的关键字段:")
+                info(f"    mark_iv: {get('mark_iv', 'N/A')}")
+                info(f"    greeks.gamma: {greeks_get('gamma', 'N/A')}")
+                info(f"    greeks.delta: {greeks_get('delta', 'N/A')}")
+                info(f"    greeks.theta: {greeks_get('theta', 'N/A')}")
+                info(f"    greeks.vega: {greeks_get('vega', 'N/A')}")
+                info("")
+                info("  所有可用字段:")
                 for key, value in pos.items():
                     if key != "greeks":  # greeks 已经单独显示
-                        logger.info(f"    {key}: {value}")
-                logger.info("-" * 80)
+                        info(f"    {key}: {value}")
+                info("-" * 80)
         
         logger.info("")
         logger.info("=" * 80)
@@ -1,14 +1,68 @@
 """Deribit API 客户端封装"""
+import os
 import time
 import requests
+from array import array
 import json
-from datetime import datetime as dt
-from typing import List, Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Optional, Tuple
 from loguru import logger
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson 比标准库 json 快数倍，未安装时回退到标准库
+try:
+    import orjson
+    
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+    
+    def _json_loads(data: bytes) -> Any:
+        return orjson.loads(data)
+    
+    def format_json(obj: Any) -> str:
+        """格式化为缩进 2 空格的 JSON 文本，用于调试脚本输出原始数据"""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+except ImportError:
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+    
+    def _json_loads(data: bytes) -> Any:
+        return json.loads(data)
+    
+    def format_json(obj: Any) -> str:
+        """格式化为缩进 2 空格的 JSON 文本，用于调试脚本输出原始数据"""
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+
+
+# 并发获取 order book 的最大线程数（与连接池大小匹配）
+_ORDER_BOOK_WORKERS = 8
+# 每个 host 的最大连接数，至少容纳全部并发线程
+_HTTP_POOL_MAXSIZE = max(16, _ORDER_BOOK_WORKERS)
+
+# DVOL 查询窗口（毫秒）：get_btc_dvol 取最近 2 天，get_dvol_history 默认 30 天
+_DAY_MS = 24 * 60 * 60 * 1000
+_DVOL_WINDOW_MS = 2 * _DAY_MS
+_DVOL_HISTORY_WINDOW_MS = 30 * _DAY_MS
+_DVOL_RESOLUTION = "1H"
+
+# JSON-RPC 错误码分类：认证失效（13000 invalid_token, 13009 unauthorized）
+# 需要重新认证；限流（10028 too_many_requests）需要退避。其余错误直接放弃
+_AUTH_ERRORS = frozenset({13000, 13009})
+_RETRYABLE_ERRORS = _AUTH_ERRORS | frozenset({10028})
+
+# 非 200 响应在日志中保留的响应体字节数
+_ERROR_BODY_PREVIEW_BYTES = 512
+
+# 共享的只读空字典，避免缺少字段时反复分配
+_EMPTY_DICT: Dict[str, Any] = {}
+
+# 重试退避时间（秒），按尝试次数索引；SSL 错误时等待更长时间
+_BACKOFF = (1, 2, 4, 8, 16)
+_SSL_BACKOFF = (4, 5, 7, 11, 19)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OptionPosition:
     """期权持仓数据类"""
     instrument_name: str
@@ -16,13 +70,28 @@ class OptionPosition:
     direction: str  # "buy" or "sell"
     size: float
     mark_iv: float
-    gamma: float
+    gamma: float  # 总持仓 Gamma 绝对值（非负）
     delta: float = 0.0
     theta: float = 0.0
-    vega: float = 0.0
+    vega: float = 0.0  # 总持仓 Vega 绝对值（非负）
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
+class PositionsBatch:
+    """期权持仓 Gamma / Vega 的列式视图（每列一个连续的 float 数组），用于批量计算预警级别"""
+    gamma: array
+    vega: array
+    
+    @classmethod
+    def from_positions(cls, positions: List[OptionPosition]) -> "PositionsBatch":
+        """由持仓列表构建列式视图，顺序与 positions 一致"""
+        return cls(
+            gamma=array("d", [position.gamma for position in positions]),
+            vega=array("d", [position.vega for position in positions])
+        )
+
+
+@dataclass(slots=True, frozen=True)
 class DvolData:
     """DVOL 数据类"""
     value: float
@@ -33,7 +102,16 @@ class DvolData:
 class DeribitClient:
     """Deribit API 客户端"""
     
-    def __init__(self, client_id: str, client_secret: str, base_url: str = "https://www.deribit.com"):
+    def __init__(
+        self, 
+        client_id: str, 
+        client_secret: str, 
+        base_url: str = "https://www.deribit.com",
+        trust_position_greeks: bool = False,
+        positions_cache_ttl: float = 0.0,
+        token_cache_file: Optional[str] = None,
+        batch_requests: bool = False
+    ):
         """
         初始化 Deribit 客户端
         
@@ -41,21 +119,70 @@ class DeribitClient:
             client_id: Deribit Client ID
             client_secret: Deribit Client Secret
             base_url: Deribit API 基础 URL
+            trust_position_greeks: 持仓自带非零 Gamma 时直接使用，不再请求 get_order_book
+            positions_cache_ttl: 持仓查询结果的缓存时间（秒），0 表示不缓存
+            token_cache_file: 持久化访问 token 的文件路径，None 表示不持久化；
+                文件中的 token 未过期时启动不再重新认证
+            batch_requests: 是否尝试 JSON-RPC 批量请求；Deribit HTTP API 不接受批量数组，
+                默认关闭，所有调用逐个（并发）发送
         """
         self.client_id = client_id
         self.client_secret = client_secret
         self.base_url = base_url.rstrip("/")
+        self.trust_position_greeks = trust_position_greeks
+        self.positions_cache_ttl = positions_cache_ttl
+        self.token_cache_file = token_cache_file
         self.api_url = f"{self.base_url}/api/v2"
         self.token = None
         self.token_expires_at = 0
         self.request_id = 0
-        self.authenticate()
+        # 认证后缓存的请求头（Content-Type 已在 session 级别设置）
+        self._auth_headers: Optional[Dict[str, str]] = None
+        # 波动率指数 OHLC 缓存: (currency, resolution) -> {"start": 覆盖起点(ms), "data": [[ts, o, h, l, c], ...]}
+        self._dvol_cache: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # 持仓缓存: (currency, kind) -> (过期时间, 持仓列表)
+        self._positions_cache: Dict[Tuple[str, str], Tuple[float, List[OptionPosition]]] = {}
+        # 是否发送 JSON-RPC 批量请求；未开启或第一次被服务端拒绝后直接逐个请求
+        self._batch_supported = batch_requests
+        
+        # 复用 keep-alive 连接，避免每次请求都重新进行 TCP/TLS 握手
+        # 多个合约的请求通过 JSON-RPC 批量合并为一次 POST，批量不可用时由线程池并发，
+        # 连接池大小与并发线程数保持一致，保证每个线程都能拿到空闲连接而不必新建
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4, 
+            pool_maxsize=_HTTP_POOL_MAXSIZE, 
+            max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        
+        if not self._load_cached_token():
+            self.authenticate()
+    
+    def close(self) -> None:
+        """关闭底层 HTTP 连接池"""
+        self.session.close()
     
     def _get_next_request_id(self) -> int:
         """获取下一个请求 ID"""
         self.request_id += 1
         return self.request_id
     
+    def _retry_sleep(self, attempt: int, ssl_error: bool = False) -> None:
+        """
+        按退避表等待后重试
+        
+        Args:
+            attempt: 当前尝试次数（从 0 开始）
+            ssl_error: 是否为 SSL 错误（等待更长时间）
+        """
+        table = _SSL_BACKOFF if ssl_error else _BACKOFF
+        wait_time = table[min(attempt, len(table) - 1)]
+        logger.info(f"{'SSL 错误，' if ssl_error else ''}等待 {wait_time} 秒后重试...")
+        time.sleep(wait_time)
+    
     def _make_request(
         self, 
         method_name: str, 
@@ -82,14 +209,15 @@ class DeribitClient:
             API 响应 result 字段，失败返回 None
         """
         url = self.api_url
-        headers = {"Content-Type": "application/json"}
+        is_private = method_name.startswith("private/")
+        headers = None
         
         # 如果是私有接口，添加认证 token
-        if method_name.startswith("private/"):
+        if is_private:
             if not self.token or time.time() >= self.token_expires_at:
                 if not self.authenticate():
                     return None
-            headers["Authorization"] = f"Bearer {self.token}"
+            headers = self._auth_headers
         
         # 构建 JSON-RPC 2.0 请求体
         request_body = {
@@ -105,15 +233,15 @@ class DeribitClient:
             try:
                 # 增加超时时间：30 秒连接超时，60 秒读取超时
                 # 对于网络不稳定的情况，给更多时间
-                response = requests.post(
+                response = self.session.post(
                     url, 
-                    json=request_body, 
+                    data=_json_dumps(request_body), 
                     headers=headers, 
                     timeout=(30, 60)  # (连接超时, 读取超时)
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = _json_loads(response.content)
                     
                     # 检查 JSON-RPC 错误
                     if "error" in result and result["error"]:
@@ -121,15 +249,18 @@ class DeribitClient:
                         error_msg = result["error"].get("message", "未知错误")
                         error_data = result["error"].get("data", {})
                         
-                        # 如果是认证错误，尝试重新认证
-                        if error_code in (13009, 13000) and "unauthorized" in error_msg.lower():
-                            logger.warning("Token 过期或无效，重新认证...")
-                            if method_name.startswith("private/"):
+                        # 可重试错误：认证失效则重新认证，限流则退避后重试
+                        if error_code in _RETRYABLE_ERRORS and attempt < retry_times - 1:
+                            if error_code not in _AUTH_ERRORS:
+                                logger.warning(f"Deribit API 限流 [{error_code}]: {error_msg}")
+                                self._retry_sleep(attempt)
+                                continue
+                            if is_private:
+                                logger.warning("Token 过期或无效，重新认证...")
                                 if not self.authenticate():
                                     return None
-                                headers["Authorization"] = f"Bearer {self.token}"
-                                if attempt < retry_times - 1:
-                                    continue
+                                headers = self._auth_headers
+                                continue
                         
                         logger.error(f"Deribit API 错误 [{error_code}]: {error_msg}")
                         if error_data:
@@ -139,37 +270,34 @@ class DeribitClient:
                     # 返回 result 字段
                     return result.get("result")
                 else:
-                    logger.error(f"HTTP {response.status_code}: {response.text}")
+                    # 只记录响应体长度和前若干字节，避免解码整个错误页面
+                    body = response.content
+                    logger.error(
+                        f"HTTP {response.status_code} ({len(body)} bytes): "
+                        f"{body[:_ERROR_BODY_PREVIEW_BYTES]!r}"
+                    )
                     if attempt < retry_times - 1:
-                        wait_time = 2 ** attempt  # 指数退避
-                        logger.info(f"等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
+                        self._retry_sleep(attempt)
                         continue
                     
             except requests.exceptions.Timeout as e:
                 logger.warning(f"请求超时 (尝试 {attempt + 1}/{retry_times}): {str(e)}")
                 if attempt < retry_times - 1:
-                    wait_time = 2 ** attempt
-                    logger.info(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
+                    self._retry_sleep(attempt)
                     continue
                 else:
                     logger.error(f"请求超时，已重试 {retry_times} 次，放弃请求")
             except requests.exceptions.SSLError as e:
                 logger.warning(f"SSL 连接错误 (尝试 {attempt + 1}/{retry_times}): {str(e)}")
                 if attempt < retry_times - 1:
-                    wait_time = 3 + (2 ** attempt)  # SSL 错误时等待更长时间
-                    logger.info(f"SSL 错误，等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
+                    self._retry_sleep(attempt, ssl_error=True)
                     continue
                 else:
                     logger.error(f"SSL 连接错误，已重试 {retry_times} 次，放弃请求")
             except requests.exceptions.RequestException as e:
                 logger.warning(f"请求异常 (尝试 {attempt + 1}/{retry_times}): {str(e)}")
                 if attempt < retry_times - 1:
-                    wait_time = 2 ** attempt
-                    logger.info(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
+                    self._retry_sleep(attempt)
                     continue
                 else:
                     logger.error(f"请求失败，已重试 {retry_times} 次，放弃请求")
@@ -179,12 +307,193 @@ class DeribitClient:
             except Exception as e:
                 logger.error(f"未知错误 (尝试 {attempt + 1}/{retry_times}): {type(e).__name__}: {str(e)}")
                 if attempt < retry_times - 1:
-                    wait_time = 2 ** attempt
-                    time.sleep(wait_time)
+                    self._retry_sleep(attempt)
                     continue
         
         return None
     
+    def _make_batch_request(self, calls: List[Tuple[str, Dict]], retry_times: int = 3) -> Optional[Dict[int, Any]]:
+        """
+        发送 JSON-RPC 2.0 批量请求，多个调用合并为一次 HTTP POST
+        
+        Args:
+            calls: (method_name, params) 列表
+            retry_times: 重试次数
+            
+        Returns:
+            {请求下标: result} 字典（出错的子请求不包含在内），
+            整体失败或服务端不支持批量请求时返回 None
+        """
+        if not calls:
+            return {}
+        
+        # 只有一个调用时批量没有意义，直接发送单个请求
+        if len(calls) == 1:
+            method_name, params = calls[0]
+            result = self._make_request(method_name, params=params)
+            return {0: result} if result is not None else {}
+        
+        if not self._batch_supported:
+            return None
+        
+        headers = None
+        if any(method_name.startswith("private/") for method_name, _ in calls):
+            if not self.token or time.time() >= self.token_expires_at:
+                if not self.authenticate():
+                    return None
+            headers = self._auth_headers
+        
+        # 用请求 ID 映射回调用下标
+        id_to_index = {}
+        request_body = []
+        for index, (method_name, params) in enumerate(calls):
+            request_id = self._get_next_request_id()
+            id_to_index[request_id] = index
+            request_body.append({
+                "jsonrpc": "2.0",
+                "method": method_name,
+                "params": params,
+                "id": request_id
+            })
+        
+        for attempt in range(retry_times):
+            try:
+                response = self.session.post(
+                    self.api_url,
+                    data=_json_dumps(request_body),
+                    headers=headers,
+                    timeout=(30, 60)
+                )
+                
+                if response.status_code != 200:
+                    # 4xx（限流除外）表示服务端拒绝批量格式，之后不再尝试；其余交给调用方回退
+                    if 400 <= response.status_code < 500 and response.status_code != 429:
+                        self._batch_supported = False
+                        logger.info(f"服务端不支持批量请求 (HTTP {response.status_code})，改为逐个请求")
+                    else:
+                        logger.debug(f"批量请求 HTTP {response.status_code}")
+                    return None
+                
+                replies = _json_loads(response.content)
+                if not isinstance(replies, list):
+                    # 服务端不支持批量请求时会返回单个错误对象
+                    self._batch_supported = False
+                    logger.info(f"服务端不支持批量请求，改为逐个请求: {replies}")
+                    return None
+                
+                # token 失效（例如恢复的缓存 token 已被吊销）时重新认证后整体重试
+                if headers is not None and attempt < retry_times - 1 and any(
+                    (reply.get("error") or _EMPTY_DICT).get("code") in _AUTH_ERRORS
+                    for reply in replies
+                ):
+                    logger.warning("Token 过期或无效，重新认证...")
+                    if not self.authenticate():
+                        return None
+                    headers = self._auth_headers
+                    continue
+                
+                results = {}
+                for reply in replies:
+                    index = id_to_index.get(reply.get("id"))
+                    if index is None:
+                        continue
+                    if reply.get("error"):
+                        logger.debug(f"批量子请求 {calls[index][0]} 失败: {reply['error']}")
+                        continue
+                    results[index] = reply.get("result")
+                return results
+            
+            except json.JSONDecodeError as e:
+                logger.error(f"批量请求 JSON 解析错误: {e}")
+                return None
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"批量请求异常 (尝试 {attempt + 1}/{retry_times}): {str(e)}")
+                if attempt < retry_times - 1:
+                    self._retry_sleep(attempt)
+        
+        return None
+    
+    def _get_order_books(self, instrument_names: List[str]) -> List[Optional[Dict]]:
+        """
+        获取多个合约的 order book（depth=1），开启 batch_requests 时优先使用批量请求
+        
+        Args:
+            instrument_names: 合约名称列表
+            
+        Returns:
+            与 instrument_names 顺序一致的 order book 列表，失败的项为 None
+        """
+        calls = [
+            ("public/get_order_book", {"instrument_name": name, "depth": 1})
+            for name in instrument_names
+        ]
+        
+        results = (self._make_batch_request(calls) if len(calls) > 1 else None) or {}
+        
+        # 批量不可用或子请求失败（例如被限流）的合约并发逐个请求，
+        # 由 _make_request 负责退避重试（I/O 密集，线程可并行等待网络）
+        missing = [index for index in range(len(calls)) if index not in results]
+        if missing:
+            logger.debug(f"并发逐个获取 {len(missing)} 个 order book")
+            with ThreadPoolExecutor(max_workers=min(_ORDER_BOOK_WORKERS, len(missing))) as executor:
+                for index, order_book in zip(missing, executor.map(
+                    lambda index: self._make_request(calls[index][0], params=calls[index][1]),
+                    missing
+                )):
+                    results[index] = order_book
+        
+        return [results.get(index) for index in range(len(calls))]
+    
+    def _load_cached_token(self) -> bool:
+        """
+        从 token_cache_file 恢复未过期的访问 token
+        
+        Returns:
+            是否恢复成功（未配置、文件不存在、账户不匹配或已过期均返回 False）
+        """
+        if not self.token_cache_file:
+            return False
+        
+        try:
+            with open(self.token_cache_file, "rb") as f:
+                cached = _json_loads(f.read())
+        except (OSError, ValueError):
+            return False
+        
+        if (
+            not isinstance(cached, dict)
+            or cached.get("client_id") != self.client_id
+            or cached.get("base_url") != self.base_url
+            or not cached.get("access_token")
+            or cached.get("expires_at", 0) <= time.time()
+        ):
+            return False
+        
+        self.token = cached["access_token"]
+        self.token_expires_at = cached["expires_at"]
+        self._auth_headers = {"Authorization": f"Bearer {self.token}"}
+        logger.info("使用缓存的 Deribit 访问 token")
+        return True
+    
+    def _save_cached_token(self) -> None:
+        """把当前访问 token 写入 token_cache_file（仅当前用户可读写），写入失败不影响认证"""
+        if not self.token_cache_file:
+            return
+        
+        tmp_file = f"{self.token_cache_file}.tmp"
+        try:
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(_json_dumps({
+                    "client_id": self.client_id,
+                    "base_url": self.base_url,
+                    "access_token": self.token,
+                    "expires_at": self.token_expires_at
+                }))
+            os.replace(tmp_file, self.token_cache_file)
+        except OSError as e:
+            logger.debug(f"写入 token 缓存失败: {e}")
+    
     def authenticate(self) -> bool:
         """
         认证并获取访问 token
@@ -203,8 +512,10 @@ class DeribitClient:
         
         if result:
             self.token = result.get("access_token")
+            self._auth_headers = {"Authorization": f"Bearer {self.token}"}
             expires_in = result.get("expires_in", 3600)  # 默认 1 小时
             self.token_expires_at = time.time() + expires_in - 60  # 提前 1 分钟过期
+            self._save_cached_token()
             logger.info("Deribit 认证成功")
             return True
         else:
@@ -215,6 +526,9 @@ class DeribitClient:
         """
         获取账户期权持仓及其 Greeks
         
+        设置了 positions_cache_ttl 时，同一 (currency, kind) 在有效期内直接返回缓存结果；
+        请求失败的结果不缓存。
+        
         Args:
             currency: 货币，如 "BTC"
             kind: 合约类型，如 "option"
@@ -222,6 +536,50 @@ class DeribitClient:
         Returns:
             期权持仓列表
         """
+        cache_key = (currency, kind)
+        if self.positions_cache_ttl > 0:
+            cached = self._positions_cache.get(cache_key)
+            if cached is not None and cached[0] > time.time():
+                logger.debug(f"{currency} 持仓使用缓存结果")
+                return list(cached[1])
+        
+        positions = self._fetch_account_option_positions(currency, kind)
+        if positions is None:
+            return []
+        
+        if self.positions_cache_ttl > 0:
+            self._positions_cache[cache_key] = (time.time() + self.positions_cache_ttl, positions)
+            positions = list(positions)
+        return positions
+    
+    def invalidate_positions_cache(self, currency: Optional[str] = None) -> None:
+        """
+        清除持仓缓存（如成交后需要立即拿到最新持仓）
+        
+        Args:
+            currency: 只清除指定货币的缓存，None 表示全部清除
+        """
+        if currency is None:
+            self._positions_cache.clear()
+            return
+        for key in [key for key in self._positions_cache if key[0] == currency]:
+            del self._positions_cache[key]
+    
+    def _fetch_account_option_positions(self, currency: str, kind: str) -> Optional[List[OptionPosition]]:
+        """
+        请求账户期权持仓并计算 Greeks
+        
+        默认对每个持仓请求 get_order_book 获取单个合约 Greeks 并乘以持仓量；
+        开启 trust_position_greeks 后，持仓自带非零 Gamma 的合约直接使用持仓值
+        （总持仓 Greeks），省去网络请求，但不再与 order book 的实时 Greeks 对齐。
+        
+        Args:
+            currency: 货币，如 "BTC"
+            kind: 合约类型，如 "option"
+            
+        Returns:
+            期权持仓列表，请求失败返回 None
+        """
         method_name = "private/get_positions"
         params = {
             "currency": currency,
@@ -231,54 +589,187 @@ class DeribitClient:
         result = self._make_request(method_name, params=params)
         
         if result is None:
-            return []
+            return None
+        
+        valid_positions, lookup_indexes = self._select_valid_positions(result)
+        fetched = self._get_order_books(
+            [valid_positions[index][1].get("instrument_name", "") for index in lookup_indexes]
+        )
+        return self._build_option_positions(kind, valid_positions, lookup_indexes, fetched)
+    
+    def get_account_option_positions_multi(
+        self,
+        currencies: Tuple[str, ...],
+        kind: str = "option"
+    ) -> Dict[str, List[OptionPosition]]:
+        """
+        一次获取多个货币的期权持仓
+        
+        各货币的 private/get_positions 并发请求（开启 batch_requests 时合并为一次批量请求），
+        所有货币所需的 order book 合并后一起获取，而不是逐个货币串行处理。
+        
+        Args:
+            currencies: 货币列表，如 ("BTC", "USDC")
+            kind: 合约类型，如 "option"
+            
+        Returns:
+            {currency: 期权持仓列表}
+        """
+        positions_by_currency: Dict[str, List[OptionPosition]] = {}
+        pending = []
+        now = time.time()
+        for currency in currencies:
+            cached = self._positions_cache.get((currency, kind)) if self.positions_cache_ttl > 0 else None
+            if cached is not None and cached[0] > now:
+                positions_by_currency[currency] = list(cached[1])
+            else:
+                pending.append(currency)
+        
+        if not pending:
+            return positions_by_currency
+        
+        calls = [
+            ("private/get_positions", {"currency": currency, "kind": kind})
+            for currency in pending
+        ]
+        replies = self._make_batch_request(calls)
+        if replies is None:
+            replies = {}
+        
+        # 批量不可用或子请求失败的货币并发逐个请求
+        missing = [index for index in range(len(calls)) if replies.get(index) is None]
+        if missing:
+            logger.debug(f"{len(missing)} 个货币的持仓并发逐个请求")
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                for index, result in zip(missing, executor.map(
+                    lambda index: self._make_request(calls[index][0], params=calls[index][1]),
+                    missing
+                )):
+                    replies[index] = result
+        
+        # 先筛选各货币的有效持仓，再把所有需要的 order book 合并为一次请求
+        prepared = []
+        lookup_names = []
+        for index, currency in enumerate(pending):
+            result = replies.get(index)
+            if result is None:
+                # 与 get_account_option_positions 一致：请求失败返回空列表且不缓存
+                positions_by_currency[currency] = []
+                continue
+            valid_positions, lookup_indexes = self._select_valid_positions(result)
+            prepared.append((currency, valid_positions, lookup_indexes, len(lookup_names)))
+            lookup_names.extend(
+                valid_positions[i][1].get("instrument_name", "") for i in lookup_indexes
+            )
+        
+        fetched = self._get_order_books(lookup_names)
+        for currency, valid_positions, lookup_indexes, offset in prepared:
+            positions = self._build_option_positions(
+                kind,
+                valid_positions,
+                lookup_indexes,
+                fetched[offset:offset + len(lookup_indexes)]
+            )
+            if self.positions_cache_ttl > 0:
+                self._positions_cache[(currency, kind)] = (time.time() + self.positions_cache_ttl, positions)
+                positions = list(positions)
+            positions_by_currency[currency] = positions
+        
+        return positions_by_currency
+    
+    def _select_valid_positions(self, result: Any) -> Tuple[List[Tuple[float, Dict]], List[int]]:
+        """
+        筛选有效持仓，并确定需要请求 order book 的持仓
         
+        Args:
+            result: private/get_positions 的返回结果
+            
+        Returns:
+            ([(size, position), ...], 需要请求 order book 的持仓下标列表)
+        """
         # result 可能是列表或单个持仓对象
         if not isinstance(result, list):
             result = [result]
         
-        if len(result) == 0:
-            return []
+        # 只保留有效持仓（size != 0），同时缓存解析后的 size
+        _float = float
+        sized_positions = [(_float(pos.get("size") or 0), pos) for pos in result]
+        valid_positions = [(size, pos) for size, pos in sized_positions if abs(size) >= 1e-8]
         
-        positions = []
-        for pos in result:
-            # 只保留有效持仓（size != 0）
-            size = float(pos.get("size", 0))
-            if abs(size) < 1e-8:
-                continue
+        # 信任持仓 Greeks 时，只为 Gamma 缺失的持仓请求 order book
+        if self.trust_position_greeks:
+            lookup_indexes = [
+                index for index, (_, pos) in enumerate(valid_positions)
+                if abs(_float(pos.get("gamma") or 0)) < 1e-8
+            ]
+        else:
+            lookup_indexes = list(range(len(valid_positions)))
+        
+        return valid_positions, lookup_indexes
+    
+    def _build_option_positions(
+        self,
+        kind: str,
+        valid_positions: List[Tuple[float, Dict]],
+        lookup_indexes: List[int],
+        fetched: List[Optional[Dict]]
+    ) -> List[OptionPosition]:
+        """
+        根据持仓和 order book 计算各持仓的 Greeks
+        
+        默认使用 get_order_book 返回的单个合约 Greeks 乘以持仓量；
+        order book 缺失时回退到持仓自带的 Greeks（总持仓值）。
+        
+        Args:
+            kind: 合约类型
+            valid_positions: _select_valid_positions 筛选出的 (size, position) 列表
+            lookup_indexes: 请求了 order book 的持仓下标
+            fetched: 与 lookup_indexes 顺序一致的 order book 列表
             
-            instrument_name = pos.get("instrument_name", "")
+        Returns:
+            期权持仓列表
+        """
+        _float = float
+        # 一次批量请求获取的 order book（单个合约 Greeks）按持仓下标对齐
+        order_books: List[Optional[Dict]] = [None] * len(valid_positions)
+        for index, order_book in zip(lookup_indexes, fetched):
+            order_books[index] = order_book
+        skipped_indexes = set(range(len(valid_positions))) - set(lookup_indexes)
+        
+        positions = []
+        for index, ((size, pos), order_book) in enumerate(zip(valid_positions, order_books)):
+            get = pos.get
+            instrument_name = get("instrument_name", "")
             
             # 直接从 private/get_positions API 获取持仓的 Gamma（总持仓 Gamma）
             # 根据测试结果，position.gamma 是总持仓 Gamma（已乘以 size），直接使用
-            mark_iv = float(pos.get("mark_iv", 0) or 0)
+            mark_iv = _float(get("mark_iv") or 0)
             
             # Gamma, Delta, Theta, Vega 直接从 position 对象中获取（总持仓值）
-            gamma = float(pos.get("gamma", 0) or 0)
-            delta = float(pos.get("delta", 0) or 0)
-            theta = float(pos.get("theta", 0) or 0)
-            vega = float(pos.get("vega", 0) or 0)
+            gamma = _float(get("gamma") or 0)
+            delta = _float(get("delta") or 0)
+            theta = _float(get("theta") or 0)
+            vega = _float(get("vega") or 0)
             
             # 如果有 greeks 字典，也尝试从中获取（作为备选）
-            greeks = pos.get("greeks", {})
+            # 只有 position 中存在为 0 的值时才需要回退
+            needs_fallback = (
+                abs(gamma) < 1e-8 or abs(delta) < 1e-8 or abs(theta) < 1e-8 or abs(vega) < 1e-8
+            )
+            greeks = (get("greeks") or _EMPTY_DICT) if needs_fallback else _EMPTY_DICT
             if greeks and isinstance(greeks, dict):
                 # 如果 position 中的值为 0，尝试从 greeks 字典获取
                 if abs(gamma) < 1e-8:
-                    gamma = float(greeks.get("gamma", 0) or 0)
+                    gamma = _float(greeks.get("gamma") or 0)
                 if abs(delta) < 1e-8:
-                    delta = float(greeks.get("delta", 0) or 0)
+                    delta = _float(greeks.get("delta") or 0)
                 if abs(theta) < 1e-8:
-                    theta = float(greeks.get("theta", 0) or 0)
+                    theta = _float(greeks.get("theta") or 0)
                 if abs(vega) < 1e-8:
-                    vega = float(greeks.get("vega", 0) or 0)
+                    vega = _float(greeks.get("vega") or 0)
             
-            # 优先从 public/get_order_book 获取单个合约的 Greeks
+            # 优先使用 public/get_order_book 返回的单个合约 Greeks
             # get_order_book 返回的是单个合约的 Gamma，需要乘以持仓量得到总持仓 Gamma
-            order_book = self._make_request(
-                "public/get_order_book",
-                params={"instrument_name": instrument_name, "depth": 1}
-            )
-            
             if order_book and "greeks" in order_book:
                 greeks_from_orderbook = order_book.get("greeks", {})
                 if isinstance(greeks_from_orderbook, dict) and "gamma" in greeks_from_orderbook:
@@ -295,9 +786,8 @@ class DeribitClient:
                         vega_total = abs(vega_per_unit)
                     
                     logger.info(
-                        f"{instrument_name}: size={size:.4f}, "
-                        f"单个合约Gamma={abs(gamma_per_unit):.8f}, "
-                        f"总持仓Gamma={gamma_total:.8f} (乘以size后)"
+                        "{}: size={:.4f}, 单个合约Gamma={:.8f}, 总持仓Gamma={:.8f} (乘以size后)",
+                        instrument_name, size, abs(gamma_per_unit), gamma_total
                     )
                     
                     # 使用总持仓 Gamma（乘以 size 后）
@@ -309,22 +799,23 @@ class DeribitClient:
                     vega = abs(vega)
                     
                     logger.info(
-                        f"{instrument_name}: size={size:.4f}, "
-                        f"API Gamma(总持仓)={gamma:.10f} (从position获取)"
+                        "{}: size={:.4f}, API Gamma(总持仓)={:.10f} (从position获取)",
+                        instrument_name, size, gamma
                     )
             else:
                 # 如果 order_book 失败，回退到从 position 获取（已经是总持仓值）
                 gamma = abs(gamma)
                 vega = abs(vega)
                 
+                reason = "信任持仓 Greeks" if index in skipped_indexes else "get_order_book失败"
                 logger.info(
-                    f"{instrument_name}: size={size:.4f}, "
-                    f"API Gamma(总持仓)={gamma:.10f} (从position获取, get_order_book失败)"
+                    "{}: size={:.4f}, API Gamma(总持仓)={:.10f} (从position获取, {})",
+                    instrument_name, size, gamma, reason
                 )
             
             position = OptionPosition(
                 instrument_name=instrument_name,
-                kind=pos.get("kind", kind),
+                kind=get("kind", kind),
                 direction="buy" if size > 0 else "sell",
                 size=abs(size),
                 mark_iv=mark_iv,
@@ -416,27 +907,18 @@ class DeribitClient:
         Returns:
             DVOL 数据，失败返回 None
         """
-        method_name = "public/get_volatility_index_data"
-        
         # 获取最近的数据（以毫秒为单位）
         # 使用较小的分辨率以获取更实时的数据
         end_timestamp = int(time.time() * 1000)
         
         # 使用 "1H" (1小时) 分辨率获取最近 2 天的数据
         # 这样既能获取到最新的值，又有足够的历史数据
-        start_timestamp = end_timestamp - (2 * 24 * 60 * 60 * 1000)  # 2 天前
+        start_timestamp = end_timestamp - _DVOL_WINDOW_MS  # 2 天前
         
         # resolution: 时间分辨率
         # 可选值: "1D" (1天), "1H" (1小时), "1M" (1分钟) 等
         # 使用 "1H" 可以获取更实时的 DVOL 值
-        params = {
-            "currency": "BTC",
-            "start_timestamp": start_timestamp,
-            "end_timestamp": end_timestamp,
-            "resolution": "1H"  # 使用 1 小时分辨率，获取更实时的数据
-        }
-        
-        result = self._make_request(method_name, params=params)
+        result = self._get_volatility_index_data("BTC", start_timestamp, end_timestamp, _DVOL_RESOLUTION)
         
         if not result:
             logger.warning("获取 DVOL 数据失败")
@@ -472,11 +954,16 @@ class DeribitClient:
             # 转换为秒级时间戳
             timestamp = timestamp_ms / 1000.0
             
-            # 转换为可读时间
-            readable_time = dt.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-            
-            logger.info(f"获取 DVOL: {dvol_value:.2f} (时间: {readable_time})")
-            logger.debug(f"DVOL 详细数据: 时间戳={timestamp_ms}, OHLC=[{latest[1]:.2f}, {latest[2]:.2f}, {latest[3]:.2f}, {latest[4]:.2f}]")
+            # 可读时间只在 INFO 级别启用时才格式化
+            logger.opt(lazy=True).info(
+                "获取 DVOL: {:.2f} (时间: {})",
+                lambda: dvol_value,
+                lambda: time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+            )
+            logger.debug(
+                "DVOL 详细数据: 时间戳={}, OHLC=[{:.2f}, {:.2f}, {:.2f}, {:.2f}]",
+                timestamp_ms, latest[1], latest[2], latest[3], latest[4]
+            )
             
             return DvolData(
                 value=dvol_value,
@@ -504,7 +991,82 @@ class DeribitClient:
             logger.error(f"DVOL 数据格式异常: {result}")
             return None
     
-    def get_dvol_history(self, currency: str = "BTC", start_timestamp: int = None, end_timestamp: int = None, resolution: str = "1D") -> List[Dict]:
+    def _get_volatility_index_data(
+        self, 
+        currency: str, 
+        start_timestamp: int, 
+        end_timestamp: int, 
+        resolution: str,
+        force_refresh: bool = False
+    ) -> Any:
+        """
+        获取波动率指数 OHLC 数据（按 (currency, resolution) 增量缓存）
+        
+        K 线只会追加不会改写，因此命中缓存时只请求最后一根缓存 K 线之后的数据，
+        最后一根 K 线可能仍在更新，会被重新拉取并覆盖。
+        
+        Args:
+            currency: 货币，如 "BTC"
+            start_timestamp: 开始时间戳（毫秒）
+            end_timestamp: 结束时间戳（毫秒）
+            resolution: 时间分辨率
+            force_refresh: 忽略缓存，重新拉取整个时间窗口
+            
+        Returns:
+            与 API 相同格式的 result（{"data": [...], "continuation": None}），失败返回 None
+        """
+        cache_key = (currency, resolution)
+        cached = None if force_refresh else self._dvol_cache.get(cache_key)
+        if cached and (cached["start"] > start_timestamp or not cached["data"]):
+            cached = None
+        
+        fetch_start = start_timestamp
+        if cached:
+            fetch_start = max(start_timestamp, int(cached["data"][-1][0]))
+        
+        params = {
+            "currency": currency,
+            "start_timestamp": fetch_start,
+            "end_timestamp": end_timestamp,
+            "resolution": resolution  # 必需参数
+        }
+        
+        result = self._make_request("public/get_volatility_index_data", params=params)
+        
+        # 非 OHLC 数组格式不做缓存，原样返回
+        if not isinstance(result, dict) or not isinstance(result.get("data"), list):
+            return result
+        new_rows = result["data"]
+        if not all(isinstance(row, list) and row for row in new_rows):
+            return result
+        
+        truncated = result.get("continuation") is not None
+        if cached and not truncated:
+            first_new_ts = int(new_rows[0][0]) if new_rows else end_timestamp + 1
+            rows = [row for row in cached["data"] if int(row[0]) < first_new_ts] + new_rows
+            covered_from = cached["start"]
+        else:
+            # 数据被分页截断时，缓存只覆盖到实际返回的最早一根 K 线
+            rows = list(new_rows)
+            covered_from = int(new_rows[0][0]) if truncated and new_rows else fetch_start
+        
+        # 裁剪到请求窗口，避免缓存无限增长
+        rows = [row for row in rows if int(row[0]) >= start_timestamp]
+        self._dvol_cache[cache_key] = {"start": max(covered_from, start_timestamp), "data": rows}
+        
+        return {
+            "data": [row for row in rows if int(row[0]) <= end_timestamp],
+            "continuation": None
+        }
+    
+    def get_dvol_history(
+        self, 
+        currency: str = "BTC", 
+        start_timestamp: int = None, 
+        end_timestamp: int = None, 
+        resolution: str = "1D",
+        force_refresh: bool = False
+    ) -> List[Dict]:
         """
         获取 DVOL 历史数据（用于计算百分位）
         
@@ -513,26 +1075,20 @@ class DeribitClient:
             start_timestamp: 开始时间戳（毫秒），如果为 None 则使用默认值
             end_timestamp: 结束时间戳（毫秒），如果为 None 则使用当前时间
             resolution: 时间分辨率，如 "1D" (1天), "1H" (1小时) 等
+            force_refresh: 忽略缓存，重新拉取整个时间窗口
             
         Returns:
             DVOL 历史数据列表
         """
-        method_name = "public/get_volatility_index_data"
-        
         if end_timestamp is None:
             end_timestamp = int(time.time() * 1000)
         if start_timestamp is None:
             # 默认获取最近 30 天的数据
-            start_timestamp = end_timestamp - (30 * 24 * 60 * 60 * 1000)
-        
-        params = {
-            "currency": currency,
-            "start_timestamp": start_timestamp,
-            "end_timestamp": end_timestamp,
-            "resolution": resolution  # 必需参数
-        }
+            start_timestamp = end_timestamp - _DVOL_HISTORY_WINDOW_MS
         
-        result = self._make_request(method_name, params=params)
+        result = self._get_volatility_index_data(
+            currency, start_timestamp, end_timestamp, resolution, force_refresh=force_refresh
+        )
         
         if not result:
             return []
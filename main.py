@@ -58,6 +58,7 @@ class MonitorDaemon:
         except Exception as e:
             logger.error(f"监控守护进程异常: {e}", exc_info=True)
         finally:
+            self.monitor.close()
             logger.info("监控系统已停止")
 
 
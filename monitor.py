@@ -1,16 +1,42 @@
 """监控逻辑核心模块"""
 import time
+import queue
+import bisect
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from loguru import logger
 
-from deribit_client import DeribitClient, OptionPosition, DvolData
+from deribit_client import DeribitClient, OptionPosition, PositionsBatch, DvolData
 from state_store import StateStore
 from notifier import (
-    send_feishu_alert
+    send_feishu_batch_alert
 )
 
 
+# 获取期权持仓的币种（常见币种）
+_POSITION_CURRENCIES = ("BTC", "USDC", "ETH", "SOL")
+
+# Gamma / Vega 分阶段预警消息模板（绑定一次 str.format）
+_GREEK_ALERT_TITLE = "🚨 {greek} {severity}预警 - {name}".format
+_GREEK_ALERT_MESSAGE = (
+    "合约: {name}\n"
+    "方向: {direction}\n"
+    "持仓量: {size}\n"
+    "当前 {greek}: {value}\n"
+    "预警级别: {severity}\n"
+    "触发阈值: {threshold}\n"
+    "⚠️ {greek} 已达到 {severity}预警水平！"
+).format
+
+# 分阶段预警级别名称，与阈值元组 (level_1, level_2, level_3) 一一对应
+_SEVERITY_LABELS = ("轻度", "中度", "重度")
+
+# 同类异常完整堆栈的最小输出间隔（秒），其余只输出一行摘要
+_TRACEBACK_LOG_INTERVAL = 60.0
+
+
 class Monitor:
     """监控器主类"""
     
@@ -28,53 +54,195 @@ class Monitor:
         self.client = DeribitClient(
             client_id=deribit_config["client_id"],
             client_secret=deribit_config["client_secret"],
-            base_url=deribit_config.get("base_url", "https://www.deribit.com")
+            base_url=deribit_config.get("base_url", "https://www.deribit.com"),
+            trust_position_greeks=deribit_config.get("trust_position_greeks", False),
+            positions_cache_ttl=deribit_config.get("positions_cache_ttl_seconds", 0),
+            batch_requests=deribit_config.get("batch_requests", False)
         )
         
         # 初始化状态存储
-        self.state_store = StateStore(max_history_minutes=60)
+        self.state_store = StateStore(
+            max_history_minutes=60,
+            compress=config.get("general", {}).get("state_compress", False)
+        )
         
         # 飞书配置
         self.feishu_webhook_url = config.get("feishu", {}).get("webhook_url", "")
         self.enable_alert = config.get("alert", {}).get("enable_alert", True)
         self.cooldown_seconds = config.get("alert", {}).get("cooldown_seconds", 300)
+        # 本轮待发送的告警
+        self._alert_buffer: List[Dict[str, Any]] = []
+        # 告警在后台线程发送，不阻塞监控循环；发送结果回传主线程后再记录冷却时间
+        self._alert_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="feishu-alert")
+        self._completed_alerts: "queue.SimpleQueue" = queue.SimpleQueue()
+        # 已提交但尚未得到发送结果的告警键，期间不重复告警
+        self._pending_alert_keys: set = set()
+        # 本进程内各告警键的发送时间（time.monotonic()），不受系统时钟调整影响
+        self._last_alert_monotonic: Dict[str, float] = {}
+        # 各异常类型上次输出完整堆栈的时间（time.monotonic()）
+        self._last_traceback_times: Dict[type, float] = {}
         
         # 监控阈值
         self.option_thresholds = config.get("option_greeks_thresholds", {})
         self.dvol_thresholds = config.get("dvol_thresholds", {})
         
+        # Gamma / Vega 分阶段阈值（轻度, 中度, 重度），需按升序配置
+        gamma_thresholds = self.option_thresholds.get("gamma", {})
+        self._gamma_levels = (
+            gamma_thresholds.get("level_1_light", 0.0001),
+            gamma_thresholds.get("level_2_medium", 0.0005),
+            gamma_thresholds.get("level_3_heavy", 0.001)
+        )
+        vega_thresholds = self.option_thresholds.get("vega", {})
+        self._vega_levels = (
+            vega_thresholds.get("level_1_light", 10.0),
+            vega_thresholds.get("level_2_medium", 30.0),
+            vega_thresholds.get("level_3_heavy", 50.0)
+        )
+        for name, levels in (("Gamma", self._gamma_levels), ("Vega", self._vega_levels)):
+            if list(levels) != sorted(levels):
+                logger.warning(f"{name} 预警阈值未按 轻度 <= 中度 <= 重度 配置: {levels}")
+        
+        # DVOL 特定预警值排序后缓存，每轮用二分查找最近的目标值
+        dvol_value_thresholds = self.dvol_thresholds.get("dvol_value", {})
+        self._dvol_specific_values = tuple(sorted(dvol_value_thresholds.get("specific_values", [])))
+        self._dvol_specific_tolerance = dvol_value_thresholds.get("specific_value_tolerance", 0.5)
+        
         # Deribit 配置
         self.currency = deribit_config.get("underlying", "BTC")
         
+        # 持仓批量请求和 DVOL 请求都是 I/O 密集型，使用常驻线程池并发获取
+        self._fetch_executor = ThreadPoolExecutor(
+            max_workers=2,
+            thread_name_prefix="deribit-fetch"
+        )
+        
         logger.info("监控器初始化完成")
         logger.info("直接获取所有持仓（不过滤）")
     
     
     def run(self) -> None:
         """执行一次监控循环"""
-        try:
-            current_time = time.time()
-            
-            # 1. 获取账户所有期权持仓（直接获取，不过滤）
-            # 尝试从主要币种获取持仓
-            currencies = ["BTC", "USDC", "ETH", "SOL"]  # 常见币种
-            all_positions = []
-            
-            for currency in currencies:
-                positions = self.client.get_account_option_positions(currency=currency)
-                all_positions.extend(positions)
-            
-            if all_positions:
-                logger.info(f"获取到 {len(all_positions)} 个期权持仓")
-                self._check_positions(all_positions, current_time)
-            
-            # 2. 获取 DVOL 数据
-            dvol_data = self.client.get_btc_dvol()
-            if dvol_data:
-                self._check_dvol(dvol_data, current_time)
+        current_time = time.time()
+        # 本轮的状态更新合并为一次文件写入
+        with self.state_store.batch():
+            self._apply_completed_alerts()
+            try:
+                # 各币种持仓合并为一次批量请求，与 DVOL 请求并发发出
+                positions_future = self._fetch_executor.submit(
+                    self.client.get_account_option_positions_multi, _POSITION_CURRENCIES
+                )
+                dvol_future = self._fetch_executor.submit(self.client.get_btc_dvol)
+                
+                # 1. 获取账户所有期权持仓（直接获取，不过滤）
+                positions_by_currency = positions_future.result()
+                all_positions = []
+                for currency in _POSITION_CURRENCIES:
+                    all_positions.extend(positions_by_currency.get(currency, []))
+                
+                if all_positions:
+                    logger.info(f"获取到 {len(all_positions)} 个期权持仓")
+                    self._check_positions(all_positions, current_time)
+                
+                # 2. 获取 DVOL 数据
+                dvol_data = dvol_future.result()
+                if dvol_data:
+                    self._check_dvol(dvol_data, current_time)
+                
+            except requests.exceptions.RequestException as e:
+                # 网络错误会反复出现，堆栈没有额外信息
+                logger.warning(f"监控循环网络异常: {type(e).__name__}: {e}")
+            except Exception as e:
+                # 同类异常每分钟最多输出一次完整堆栈，避免持续故障时刷屏
+                now = time.monotonic()
+                error_type = type(e)
+                last_traced = self._last_traceback_times.get(error_type)
+                if last_traced is None or now - last_traced >= _TRACEBACK_LOG_INTERVAL:
+                    self._last_traceback_times[error_type] = now
+                    logger.opt(exception=e).error(f"监控循环执行异常: {e}")
+                else:
+                    logger.error(f"监控循环执行异常: {error_type.__name__}: {e}")
+            finally:
+                # 本轮产生的告警合并为一条消息发送
+                self.flush_alerts(current_time)
+    
+    def _queue_alert(
+        self,
+        alert_key: str,
+        group: str,
+        title: str,
+        message: str,
+        detail: Optional[Dict[str, Any]],
+        sent_log: str
+    ) -> None:
+        """
+        将告警加入本轮缓冲区，在 flush_alerts 中统一发送
+        
+        Args:
+            alert_key: 告警键（用于冷却时间）
+            group: 分组（预警级别），用于合并消息中的排序
+            title: 告警标题
+            message: 告警消息内容
+            detail: 详细信息字典（可选）
+            sent_log: 发送成功后输出的日志
+        """
+        self._alert_buffer.append({
+            "alert_key": alert_key,
+            "group": group,
+            "title": title,
+            "message": message,
+            "detail": detail,
+            "sent_log": sent_log
+        })
+    
+    def flush_alerts(self, current_time: float) -> None:
+        """
+        将缓冲区中的告警合并为一条飞书消息，提交到后台线程发送
+        
+        发送成功后才记录冷却时间（由 _apply_completed_alerts 在主线程中处理）
+        
+        Args:
+            current_time: 当前时间戳
+        """
+        if not self._alert_buffer:
+            return
+        
+        alerts, self._alert_buffer = self._alert_buffer, []
+        self._pending_alert_keys.update(alert["alert_key"] for alert in alerts)
+        
+        sent_monotonic = time.monotonic()
+        
+        def on_done(future) -> None:
+            success = future.exception() is None and bool(future.result())
+            self._completed_alerts.put((alerts, current_time, sent_monotonic, success))
+        
+        future = self._alert_executor.submit(
+            send_feishu_batch_alert, alerts, webhook_url=self.feishu_webhook_url
+        )
+        future.add_done_callback(on_done)
+    
+    def _apply_completed_alerts(self) -> None:
+        """在主线程中处理后台发送完成的告警：清除待发送标记，成功的记录冷却时间"""
+        while True:
+            try:
+                alerts, sent_time, sent_monotonic, success = self._completed_alerts.get_nowait()
+            except queue.Empty:
+                return
             
-        except Exception as e:
-            logger.error(f"监控循环执行异常: {e}", exc_info=True)
+            for alert in alerts:
+                self._pending_alert_keys.discard(alert["alert_key"])
+                if success:
+                    self._last_alert_monotonic[alert["alert_key"]] = sent_monotonic
+                    self.state_store.set_last_alert_time(alert["alert_key"], sent_time)
+                    logger.warning(alert["sent_log"])
+    
+    def close(self) -> None:
+        """释放线程池和 HTTP 连接（等待未完成的告警发送）"""
+        self._fetch_executor.shutdown(wait=True)
+        self._alert_executor.shutdown(wait=True)
+        self._apply_completed_alerts()
+        self.state_store.flush()
+        self.client.close()
     
     def _check_positions(self, positions: List[OptionPosition], current_time: float) -> None:
         """
@@ -84,73 +252,35 @@ class Monitor:
             positions: 期权持仓列表
             current_time: 当前时间戳
         """
-        for position in positions:
+        # 先基于 Gamma / Vega 列式视图一次算出所有持仓的预警级别，
+        # 循环中只对达到阈值的持仓进入告警逻辑。
+        # DeribitClient 输出的 gamma / vega 已是绝对值，这里无需再取 abs
+        batch = PositionsBatch.from_positions(positions)
+        bisect_right = bisect.bisect_right
+        gamma_levels = self._gamma_levels
+        vega_levels = self._vega_levels
+        level_indexes = [
+            (bisect_right(gamma_levels, gamma), bisect_right(vega_levels, vega))
+            for gamma, vega in zip(batch.gamma, batch.vega)
+        ]
+        
+        set_state = self.state_store.set
+        for position, (gamma_index, vega_index) in zip(positions, level_indexes):
             instrument_name = position.instrument_name
             
-            # 获取历史数据（5 分钟前）
-            history_5m = self.state_store.get_history(instrument_name, minutes=5)
-            
-            if not history_5m:
-                # 没有历史数据，直接保存当前值
-                logger.info(
-                    f"{instrument_name}: Gamma={position.gamma:.8f}, Vega={position.vega:.2f}"
-                )
-                self.state_store.set(
-                    instrument_name,
-                    {
-                        "gamma": position.gamma,
-                        "vega": position.vega,
-                        "delta": position.delta,
-                        "direction": position.direction,
-                        "size": position.size
-                    },
-                    current_time
-                )
-                # 检查 Gamma 分阶段预警和 Vega 预警
-                self._check_gamma_levels(position, current_time)
-                self._check_vega_threshold(position, current_time)
-                continue
-            
-            # 找到 5 分钟前最接近的数据
-            target_time = current_time - (5 * 60)
-            history_sorted = sorted(history_5m, key=lambda x: abs(x.get("timestamp", 0) - target_time))
-            
-            if not history_sorted:
-                # 保存当前值并继续
-                # 输出当前持仓信息（包括 Gamma 和 Vega 绝对数值）
-                logger.info(
-                    f"{instrument_name}: Gamma={position.gamma:.8f}, Vega={position.vega:.2f}"
-                )
-                self.state_store.set(
-                    instrument_name,
-                    {
-                        "gamma": position.gamma,
-                        "vega": position.vega,
-                        "delta": position.delta,
-                        "direction": position.direction,
-                        "size": position.size
-                    },
-                    current_time
-                )
-                # 检查 Gamma 分阶段预警和 Vega 预警
-                self._check_gamma_levels(position, current_time)
-                self._check_vega_threshold(position, current_time)
-                continue
-            
-            # 不再需要检查 Gamma 5分钟变化，直接输出当前值并检查绝对值阈值
-            # 输出当前持仓信息（包括 Gamma 和 Vega 绝对数值）
-            logger.info(
-                f"{instrument_name}: Gamma={position.gamma:.8f}, Vega={position.vega:.2f}"
-            )
+            # 输出当前持仓信息（包括 Gamma 和 Vega 绝对数值），级别未启用时不做格式化
+            logger.info("{}: Gamma={:.8f}, Vega={:.2f}", instrument_name, position.gamma, position.vega)
             
             # 检查 Gamma 分阶段预警（绝对值阈值）
-            self._check_gamma_levels(position, current_time)
+            if gamma_index:
+                self._check_gamma_levels(position, current_time, gamma_index)
             
             # 检查 Vega 预警
-            self._check_vega_threshold(position, current_time)
+            if vega_index:
+                self._check_vega_threshold(position, current_time, vega_index)
             
             # 保存当前值（保存 Gamma 和 Vega）
-            self.state_store.set(
+            set_state(
                 instrument_name,
                 {
                     "gamma": position.gamma,
@@ -162,145 +292,123 @@ class Monitor:
                 current_time
             )
     
-    def _check_gamma_levels(self, position: OptionPosition, current_time: float) -> None:
+    def _check_gamma_levels(
+        self, 
+        position: OptionPosition, 
+        current_time: float, 
+        level_index: Optional[int] = None
+    ) -> None:
         """
         检查 Gamma 分阶段预警（轻度/中度/重度）
         
         Args:
             position: 期权持仓
             current_time: 当前时间戳
+            level_index: 已算好的预警级别（bisect 结果），None 时重新计算
         """
         gamma_value = abs(position.gamma)  # 使用绝对值
-        gamma_thresholds = self.option_thresholds.get("gamma", {})
+        levels = self._gamma_levels
         
-        level_1 = gamma_thresholds.get("level_1_light", 0.0001)
-        level_2 = gamma_thresholds.get("level_2_medium", 0.0005)
-        level_3 = gamma_thresholds.get("level_3_heavy", 0.001)
-        
-        # 判断当前处于哪个阶段
-        alert_level = None
-        alert_severity = None
-        
-        if gamma_value >= level_3:
-            alert_level = level_3
-            alert_severity = "重度"
-        elif gamma_value >= level_2:
-            alert_level = level_2
-            alert_severity = "中度"
-        elif gamma_value >= level_1:
-            alert_level = level_1
-            alert_severity = "轻度"
+        # 判断当前处于哪个阶段（达到的最高级别，0 表示未达到任何级别）
+        if level_index is None:
+            level_index = bisect.bisect_right(levels, gamma_value)
+        alert_level = levels[level_index - 1] if level_index else None
+        alert_severity = _SEVERITY_LABELS[level_index - 1] if level_index else None
         
         if alert_level is not None:
             alert_key = f"{position.instrument_name}_gamma_level_{alert_severity}"
             
-            # 检查冷却时间
+            # 检查冷却时间（冷却期内不构建任何消息）
             if not self._should_alert(alert_key, current_time):
-                logger.debug(f"{alert_key} 在冷却期内，跳过告警")
+                logger.debug("{} 在冷却期内，跳过告警", alert_key)
                 return
             
             # 发送告警
             if self.enable_alert:
-                title = f"🚨 Gamma {alert_severity}预警 - {position.instrument_name}"
-                message = (
-                    f"合约: {position.instrument_name}\n"
-                    f"方向: {position.direction.upper()}\n"
-                    f"持仓量: {position.size}\n"
-                    f"当前 Gamma: {gamma_value:.8f}\n"
-                    f"预警级别: {alert_severity}\n"
-                    f"触发阈值: {alert_level:.8f}\n"
-                    f"⚠️ Gamma 已达到 {alert_severity}预警水平！"
-                )
-                
-                detail = {
-                    "预警级别": alert_severity,
-                    "当前 Gamma": f"{gamma_value:.8f}",
-                    "触发阈值": f"{alert_level:.8f}"
-                }
-                
-                success = send_feishu_alert(
-                    title=title,
-                    message=message,
-                    webhook_url=self.feishu_webhook_url,
-                    detail=detail
+                value_text = f"{gamma_value:.8f}"
+                threshold_text = f"{alert_level:.8f}"
+                self._queue_alert(
+                    alert_key,
+                    alert_severity,
+                    _GREEK_ALERT_TITLE(greek="Gamma", severity=alert_severity, name=position.instrument_name),
+                    _GREEK_ALERT_MESSAGE(
+                        greek="Gamma",
+                        severity=alert_severity,
+                        name=position.instrument_name,
+                        direction=position.direction.upper(),
+                        size=position.size,
+                        value=value_text,
+                        threshold=threshold_text
+                    ),
+                    {
+                        "预警级别": alert_severity,
+                        "当前 Gamma": value_text,
+                        "触发阈值": threshold_text
+                    },
+                    f"Gamma {alert_severity}预警已发送: {position.instrument_name} - Gamma={value_text}"
                 )
-                
-                if success:
-                    self.state_store.set_last_alert_time(alert_key, current_time)
-                    logger.warning(f"Gamma {alert_severity}预警已发送: {position.instrument_name} - Gamma={gamma_value:.8f}")
             else:
-                logger.info(f"[告警已禁用] Gamma {alert_severity}预警: {position.instrument_name} - Gamma={gamma_value:.8f}")
+                logger.info("[告警已禁用] Gamma {}预警: {} - Gamma={:.8f}", alert_severity, position.instrument_name, gamma_value)
         
         # 只在触发预警时输出 Gamma 值
     
-    def _check_vega_threshold(self, position: OptionPosition, current_time: float) -> None:
+    def _check_vega_threshold(
+        self, 
+        position: OptionPosition, 
+        current_time: float, 
+        level_index: Optional[int] = None
+    ) -> None:
         """
         检查 Vega 分阶段预警（轻度/中度/重度）
         
         Args:
             position: 期权持仓
             current_time: 当前时间戳
+            level_index: 已算好的预警级别（bisect 结果），None 时重新计算
         """
         vega_value = abs(position.vega)  # 使用绝对值
-        vega_thresholds = self.option_thresholds.get("vega", {})
-        
-        level_1 = vega_thresholds.get("level_1_light", 10.0)
-        level_2 = vega_thresholds.get("level_2_medium", 30.0)
-        level_3 = vega_thresholds.get("level_3_heavy", 50.0)
-        
-        # 判断当前处于哪个阶段
-        alert_level = None
-        alert_severity = None
+        levels = self._vega_levels
         
-        if vega_value >= level_3:
-            alert_level = level_3
-            alert_severity = "重度"
-        elif vega_value >= level_2:
-            alert_level = level_2
-            alert_severity = "中度"
-        elif vega_value >= level_1:
-            alert_level = level_1
-            alert_severity = "轻度"
+        # 判断当前处于哪个阶段（达到的最高级别，0 表示未达到任何级别）
+        if level_index is None:
+            level_index = bisect.bisect_right(levels, vega_value)
+        alert_level = levels[level_index - 1] if level_index else None
+        alert_severity = _SEVERITY_LABELS[level_index - 1] if level_index else None
         
         if alert_level is not None:
             alert_key = f"{position.instrument_name}_vega_level_{alert_severity}"
             
-            # 检查冷却时间
+            # 检查冷却时间（冷却期内不构建任何消息）
             if not self._should_alert(alert_key, current_time):
-                logger.debug(f"{alert_key} 在冷却期内，跳过告警")
+                logger.debug("{} 在冷却期内，跳过告警", alert_key)
                 return
             
             # 发送告警
             if self.enable_alert:
-                title = f"🚨 Vega {alert_severity}预警 - {position.instrument_name}"
-                message = (
-                    f"合约: {position.instrument_name}\n"
-                    f"方向: {position.direction.upper()}\n"
-                    f"持仓量: {position.size}\n"
-                    f"当前 Vega: {vega_value:.2f}\n"
-                    f"预警级别: {alert_severity}\n"
-                    f"触发阈值: {alert_level:.2f}\n"
-                    f"⚠️ Vega 已达到 {alert_severity}预警水平！"
-                )
-                
-                detail = {
-                    "预警级别": alert_severity,
-                    "当前 Vega": f"{vega_value:.2f}",
-                    "触发阈值": f"{alert_level:.2f}"
-                }
-                
-                success = send_feishu_alert(
-                    title=title,
-                    message=message,
-                    webhook_url=self.feishu_webhook_url,
-                    detail=detail
+                value_text = f"{vega_value:.2f}"
+                threshold_text = f"{alert_level:.2f}"
+                self._queue_alert(
+                    alert_key,
+                    alert_severity,
+                    _GREEK_ALERT_TITLE(greek="Vega", severity=alert_severity, name=position.instrument_name),
+                    _GREEK_ALERT_MESSAGE(
+                        greek="Vega",
+                        severity=alert_severity,
+                        name=position.instrument_name,
+                        direction=position.direction.upper(),
+                        size=position.size,
+                        value=value_text,
+                        threshold=threshold_text
+                    ),
+                    {
+                        "预警级别": alert_severity,
+                        "当前 Vega": value_text,
+                        "触发阈值": threshold_text
+                    },
+                    f"Vega {alert_severity}预警已发送: {position.instrument_name} - Vega={value_text}"
                 )
-                
-                if success:
-                    self.state_store.set_last_alert_time(alert_key, current_time)
-                    logger.warning(f"Vega {alert_severity}预警已发送: {position.instrument_name} - Vega={vega_value:.2f}")
             else:
-                logger.info(f"[告警已禁用] Vega {alert_severity}预警: {position.instrument_name} - Vega={vega_value:.2f}")
+                logger.info("[告警已禁用] Vega {}预警: {} - Vega={:.2f}", alert_severity, position.instrument_name, vega_value)
         
         # 只在触发预警时输出 Vega 值
     
@@ -314,24 +422,17 @@ class Monitor:
         """
         current_dvol = dvol_data.value
         
-        # 获取历史数据
-        history_5m = self.state_store.get_history("dvol", minutes=5)
+        # 在最近 5 分钟的历史中找到最接近 5 分钟前的数据
+        target_time = current_time - (5 * 60)
+        closest = self.state_store.get_nearest("dvol", target_time, min_timestamp=target_time)
         
-        if not history_5m:
+        if closest is None:
             # 没有历史数据，直接保存
             logger.info(f"[DVOL 监控] DVOL 首次记录: 当前值={current_dvol:.2f}")
             self.state_store.set("dvol", current_dvol, current_time)
             return
         
-        # 找到 5 分钟前最接近的数据
-        target_time = current_time - (5 * 60)
-        history_sorted = sorted(history_5m, key=lambda x: abs(x.get("timestamp", 0) - target_time))
-        
-        if not history_sorted:
-            self.state_store.set("dvol", current_dvol, current_time)
-            return
-        
-        previous_dvol = history_sorted[0].get("value")
+        previous_dvol = closest.get("value")
         
         if previous_dvol is None:
             self.state_store.set("dvol", current_dvol, current_time)
@@ -344,39 +445,42 @@ class Monitor:
             pct_change = (current_dvol - previous_dvol) / previous_dvol
         abs_change = current_dvol - previous_dvol
         
-        # 格式化变化信息
-        change_sign = "+" if pct_change >= 0 else ""
-        abs_sign = "+" if abs_change >= 0 else ""
-        
         # 检查 DVOL 数值异动
         dvol_value_thresholds = self.dvol_thresholds.get("dvol_value", {})
         abs_value_threshold = dvol_value_thresholds.get("abs_threshold", 60.0)  # 绝对数值阈值
         pct_threshold = dvol_value_thresholds.get("pct_change_5m", 0.05)
         abs_change_threshold = dvol_value_thresholds.get("abs_change_5m", 5.0)
         
-        # 输出变动情况（无论是否触发告警）
-        logger.info(
-            f"[DVOL 监控] DVOL 数值: "
-            f"当前={current_dvol:.2f}, 5分钟前={previous_dvol:.2f}, "
-            f"变化={change_sign}{pct_change*100:.2f}% ({abs_sign}{abs_change:.2f}), "
-            f"绝对数值阈值={abs_value_threshold:.2f}, 变化阈值={pct_threshold*100:.2f}%/{abs_change_threshold:.2f}"
-        )
-        
         # 检查绝对数值预警
         should_alert_abs_value = current_dvol >= abs_value_threshold
         
         # 检查5分钟变化预警
         should_alert_change = (abs(pct_change) > pct_threshold) or (abs(abs_change) > abs_change_threshold)
         
+        # 输出变动情况（无论是否触发告警）
+        # 使用 loguru 的参数化格式，INFO 级别未启用时不做字符串格式化
+        logger.info(
+            "[DVOL 监控] DVOL 数值: 当前={:.2f}, 5分钟前={:.2f}, 变化={:+.2%} ({:+.2f}), "
+            "绝对数值阈值={:.2f}, 变化阈值={:.2%}/{:.2f}",
+            current_dvol, previous_dvol, pct_change, abs_change,
+            abs_value_threshold, pct_threshold, abs_change_threshold
+        )
+        
         # 检查特定 DVOL 值预警
-        specific_values = dvol_value_thresholds.get("specific_values", [])
-        specific_tolerance = dvol_value_thresholds.get("specific_value_tolerance", 0.5)
+        specific_values = self._dvol_specific_values
+        specific_tolerance = self._dvol_specific_tolerance
         matched_specific_value = None
         
-        for target_value in specific_values:
-            if abs(current_dvol - target_value) <= specific_tolerance:
-                matched_specific_value = target_value
-                break
+        if specific_values:
+            # 只需比较插入点两侧的相邻目标值，取其中距离最近的一个
+            idx = bisect.bisect_left(specific_values, current_dvol)
+            for target_value in specific_values[max(0, idx - 1):idx + 1]:
+                distance = abs(current_dvol - target_value)
+                if distance <= specific_tolerance and (
+                    matched_specific_value is None
+                    or distance < abs(current_dvol - matched_specific_value)
+                ):
+                    matched_specific_value = target_value
         
         # 特定值预警（优先检查）
         if matched_specific_value is not None:
@@ -399,16 +503,14 @@ class Monitor:
                         "容差范围": f"±{specific_tolerance:.2f}"
                     }
                     
-                    success = send_feishu_alert(
-                        title=title,
-                        message=message,
-                        webhook_url=self.feishu_webhook_url,
-                        detail=detail
+                    self._queue_alert(
+                        alert_key,
+                        "DVOL",
+                        title,
+                        message,
+                        detail,
+                        f"DVOL 特定值预警已发送: {current_dvol:.2f} 接近 {matched_specific_value}"
                     )
-                    
-                    if success:
-                        self.state_store.set_last_alert_time(alert_key, current_time)
-                        logger.warning(f"DVOL 特定值预警已发送: {current_dvol:.2f} 接近 {matched_specific_value}")
         
         # 绝对数值预警
         if should_alert_abs_value:
@@ -429,16 +531,14 @@ class Monitor:
                         "预警阈值": f"{abs_value_threshold:.2f}"
                     }
                     
-                    success = send_feishu_alert(
-                        title=title,
-                        message=message,
-                        webhook_url=self.feishu_webhook_url,
-                        detail=detail
+                    self._queue_alert(
+                        alert_key,
+                        "DVOL",
+                        title,
+                        message,
+                        detail,
+                        f"DVOL 绝对数值预警已发送: {current_dvol:.2f} >= {abs_value_threshold:.2f}"
                     )
-                    
-                    if success:
-                        self.state_store.set_last_alert_time(alert_key, current_time)
-                        logger.warning(f"DVOL 绝对数值预警已发送: {current_dvol:.2f} >= {abs_value_threshold:.2f}")
         
         # 5分钟变化预警
         if should_alert_change:
@@ -450,7 +550,7 @@ class Monitor:
                     message = (
                         f"DVOL 当前值: {current_dvol:.2f}\n"
                         f"5分钟前: {previous_dvol:.2f}\n"
-                        f"变化: {change_sign}{pct_change*100:.2f}% ({abs_sign}{abs_change:.2f})\n"
+                        f"变化: {pct_change:+.2%} ({abs_change:+.2f})\n"
                         f"触发条件: 5分钟变化超过 {pct_threshold*100:.2f}% 或绝对值变化超过 {abs_change_threshold:.2f}"
                     )
                     
@@ -458,16 +558,14 @@ class Monitor:
                         "触发条件": f"5 分钟变化 {pct_change*100:.2f}% (阈值: {pct_threshold*100:.2f}%) 或 绝对值变化 {abs_change:.2f} (阈值: {abs_change_threshold:.2f})"
                     }
                     
-                    success = send_feishu_alert(
-                        title=title,
-                        message=message,
-                        webhook_url=self.feishu_webhook_url,
-                        detail=detail
+                    self._queue_alert(
+                        alert_key,
+                        "DVOL",
+                        title,
+                        message,
+                        detail,
+                        f"DVOL 异动告警已发送: 变化 {pct_change*100:.2f}%"
                     )
-                    
-                    if success:
-                        self.state_store.set_last_alert_time(alert_key, current_time)
-                        logger.warning(f"DVOL 异动告警已发送: 变化 {pct_change*100:.2f}%")
         
         # 保存当前 DVOL 值
         self.state_store.set("dvol", current_dvol, current_time)
@@ -483,11 +581,15 @@ class Monitor:
         Returns:
             是否应该告警
         """
-        last_alert_time = self.state_store.get_last_alert_time(alert_key)
+        if alert_key in self._pending_alert_keys:
+            return False
         
-        if last_alert_time is None:
-            return True
+        # 本进程发送过的告警用单调时钟计算冷却，避免 NTP 校时导致时钟回拨时重复告警
+        last_alert_monotonic = self._last_alert_monotonic.get(alert_key)
+        if last_alert_monotonic is not None:
+            return time.monotonic() - last_alert_monotonic >= self.cooldown_seconds
         
-        elapsed = current_time - last_alert_time
-        return elapsed >= self.cooldown_seconds
+        # 重启前发送的告警只有持久化的墙上时间可用
+        last_alert_time = self.state_store.get_last_alert_time(alert_key)
+        return last_alert_time is None or current_time - last_alert_time >= self.cooldown_seconds
 
@@ -1,61 +1,89 @@
 """飞书 Webhook 告警通知模块"""
 import requests
 import json
-from typing import Dict, Any, Optional
-from datetime import datetime
+import time
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, List, Optional
 from loguru import logger
 
+# 消息体预先序列化为 UTF-8 字节，优先使用 orjson
+try:
+    import orjson
+    
+    def _encode_payload(payload: Dict[str, Any]) -> bytes:
+        return orjson.dumps(payload)
+except ImportError:
+    def _encode_payload(payload: Dict[str, Any]) -> bytes:
+        return json.dumps(payload, ensure_ascii=False).encode("utf-8")
 
-def send_feishu_alert(
-    title: str,
-    message: str,
-    webhook_url: str,
-    detail: Optional[Dict[str, Any]] = None
-) -> bool:
+
+# 复用到飞书 Webhook 的 keep-alive 连接；429/5xx 时由连接池自动退避重试
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False
+    )
+))
+_SESSION.headers.update({"Content-Type": "application/json; charset=utf-8"})
+
+# 合并告警消息中各分组的显示顺序（按严重程度）
+_GROUP_ORDER = ("重度", "中度", "轻度", "DVOL")
+
+
+@lru_cache(maxsize=2)
+def _format_utc_second(second: int) -> str:
+    """格式化指定秒的 UTC 时间字符串（同一秒内的告警复用结果）"""
+    return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(second))
+
+
+def _utc_now_str() -> str:
+    """当前 UTC 时间字符串，精确到秒"""
+    return _format_utc_second(int(time.time()))
+
+
+def _format_alert_text(title: str, message: str, detail: Optional[Dict[str, Any]] = None) -> str:
+    """拼接单条告警的完整文本"""
+    full_message = f"{title}\n\n{message}"
+    
+    if detail:
+        full_message += "\n\n详细信息："
+        for key, value in detail.items():
+            full_message += f"\n{key}: {value}"
+    
+    return full_message
+
+
+def _post_feishu(payload: Dict[str, Any], webhook_url: str, description: str) -> bool:
     """
-    发送飞书告警消息
+    向飞书 Webhook 发送消息
     
     Args:
-        title: 告警标题
-        message: 告警消息内容
+        payload: 飞书消息体
         webhook_url: 飞书 Webhook URL
-        detail: 详细信息字典（可选）
+        description: 日志中使用的消息描述
         
     Returns:
         是否发送成功
     """
-    if not webhook_url:
-        logger.warning("飞书 Webhook URL 未配置，跳过发送")
-        return False
-    
     try:
-        # 构建消息文本
-        full_message = f"{title}\n\n{message}"
-        
-        if detail:
-            full_message += "\n\n详细信息："
-            for key, value in detail.items():
-                full_message += f"\n{key}: {value}"
-        
-        # 飞书 Webhook 标准格式（文本消息）
-        payload = {
-            "msg_type": "text",
-            "content": {
-                "text": full_message
-            }
-        }
-        
-        response = requests.post(
+        response = _SESSION.post(
             webhook_url,
-            json=payload,
-            headers={"Content-Type": "application/json"},
+            data=_encode_payload(payload),
             timeout=10
         )
         
         if response.status_code == 200:
             result = response.json()
             if result.get("code") == 0:
-                logger.info(f"飞书告警发送成功: {title}")
+                logger.info(f"飞书告警发送成功: {description}")
                 return True
             else:
                 logger.error(f"飞书告警发送失败: {result.get('msg', '未知错误')}")
@@ -75,6 +103,91 @@ def send_feishu_alert(
         return False
 
 
+def send_feishu_alert(
+    title: str,
+    message: str,
+    webhook_url: str,
+    detail: Optional[Dict[str, Any]] = None
+) -> bool:
+    """
+    发送飞书告警消息
+    
+    Args:
+        title: 告警标题
+        message: 告警消息内容
+        webhook_url: 飞书 Webhook URL
+        detail: 详细信息字典（可选）
+        
+    Returns:
+        是否发送成功
+    """
+    if not webhook_url:
+        logger.warning("飞书 Webhook URL 未配置，跳过发送")
+        return False
+    
+    # 飞书 Webhook 标准格式（文本消息）
+    payload = {
+        "msg_type": "text",
+        "content": {
+            "text": _format_alert_text(title, message, detail)
+        }
+    }
+    
+    return _post_feishu(payload, webhook_url, title)
+
+
+def send_feishu_batch_alert(alerts: List[Dict[str, Any]], webhook_url: str) -> bool:
+    """
+    将多条告警合并为一条飞书富文本（post）消息发送，按预警级别分组
+    
+    Args:
+        alerts: 告警列表，每项包含 group、title、message、detail
+        webhook_url: 飞书 Webhook URL
+        
+    Returns:
+        是否发送成功
+    """
+    if not webhook_url:
+        logger.warning("飞书 Webhook URL 未配置，跳过发送")
+        return False
+    
+    if not alerts:
+        return True
+    
+    def group_rank(alert: Dict[str, Any]) -> int:
+        group = alert.get("group")
+        return _GROUP_ORDER.index(group) if group in _GROUP_ORDER else len(_GROUP_ORDER)
+    
+    # 富文本内容：每一行为一个段落
+    content = []
+    current_group = None
+    for alert in sorted(alerts, key=group_rank):
+        group = alert.get("group")
+        if group != current_group:
+            content.append([{"tag": "text", "text": f"【{group}】"}])
+            current_group = group
+        
+        text = _format_alert_text(alert["title"], alert["message"], alert.get("detail"))
+        for line in text.split("\n"):
+            content.append([{"tag": "text", "text": line}])
+        content.append([{"tag": "text", "text": ""}])
+    
+    title = f"Deribit 监控告警（{len(alerts)} 条）"
+    payload = {
+        "msg_type": "post",
+        "content": {
+            "post": {
+                "zh_cn": {
+                    "title": title,
+                    "content": content
+                }
+            }
+        }
+    }
+    
+    return _post_feishu(payload, webhook_url, title)
+
+
 def format_option_alert(
     instrument_name: str,
     metric_type: str,  # "IV" 或 "Gamma"
@@ -97,7 +210,7 @@ def format_option_alert(
     change_sign = "+" if pct_change >= 0 else ""
     abs_sign = "+" if abs_change >= 0 else ""
     
-    current_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
+    current_time = _utc_now_str()
     
     message = f"""合约: {instrument_name}
 方向: {direction.upper()}
@@ -131,7 +244,7 @@ def format_dvol_alert(
     change_sign = "+" if pct_change >= 0 else ""
     abs_sign = "+" if abs_change >= 0 else ""
     
-    current_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
+    current_time = _utc_now_str()
     
     message = f"""当前 DVOL: {current_dvol:.2f}
 5 分钟前 DVOL: {previous_dvol:.2f}
@@ -163,7 +276,7 @@ def format_dvol_percentile_alert(
     change_sign = "+" if pct_change >= 0 else ""
     abs_sign = "+" if abs_change >= 0 else ""
     
-    current_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
+    current_time = _utc_now_str()
     
     message = f"""当前 DVOL: {current_dvol:.2f}
 当前 IV 百分位: {current_percentile*100:.1f}%
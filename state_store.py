@@ -1,80 +1,386 @@
 """状态存储模块 - 用于持久化监控数据"""
 import json
 import os
+import hashlib
 import time
+import bisect
+import atexit
+import mmap
+import operator
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator
 from datetime import datetime, timedelta
 from loguru import logger
 
+# 状态文件使用紧凑 JSON，优先使用 orjson（比标准库快数倍），未安装时回退到标准库
+try:
+    import orjson
+    
+    def _dumps_state(state: Dict[str, Any]) -> bytes:
+        # 内存中的历史记录为 deque，序列化时转为列表
+        return orjson.dumps(state, default=list)
+    
+    def _loads_state(data: bytes) -> Any:
+        return orjson.loads(data)
+except ImportError:
+    def _dumps_state(state: Dict[str, Any]) -> bytes:
+        return json.dumps(state, ensure_ascii=False, separators=(",", ":"), default=list).encode("utf-8")
+    
+    def _loads_state(data: bytes) -> Any:
+        # 标准库 json 不接受 memoryview
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+# 快照可选使用 zstd 压缩（需要安装 zstandard）
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# zstd 帧头魔数，用于加载时识别快照是否被压缩
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# 快照小于该大小时直接读入内存，mmap 的建立开销反而更大
+_MMAP_MIN_BYTES = 64 * 1024
+
+
+# 合并写入：累计修改次数或距上次写入的时间达到阈值时才写入日志文件
+_FLUSH_EVERY_N = 50
+_FLUSH_INTERVAL_SECONDS = 5.0
+
+# 日志文件超过该大小或距上次压缩超过该时间时，重写完整快照并清空日志
+_JOURNAL_COMPACT_BYTES = 1 << 20
+_COMPACT_INTERVAL_SECONDS = 600.0
+
+# 日志文件同步写入：O_DSYNC 不可用时（如 Windows）写入后显式同步
+_O_DSYNC = getattr(os, "O_DSYNC", 0)
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+# 日志写缓冲区超过该大小时不再保留
+_WRITE_BUFFER_SOFT_MAX = 128 * 1024
+
+
+# 历史记录的时间戳（用作排序和二分查找的 key）；set() 写入的记录总是包含 timestamp
+_timestamp_of = operator.itemgetter("timestamp")
+
 
 class StateStore:
-    """状态存储类 - 使用 JSON 文件存储最近的数据"""
+    """
+    状态存储类 - 使用 JSON 文件存储最近的数据
+    
+    每次修改只向 .journal 日志文件追加一行记录，完整快照只在压缩时重写；
+    加载时先读取快照，再重放日志。
+    """
     
-    def __init__(self, filename: str = "state_store.json", max_history_minutes: int = 60):
+    def __init__(
+        self,
+        filename: str = "state_store.json",
+        max_history_minutes: int = 60,
+        max_history_points: Optional[int] = None,
+        compress: bool = False
+    ):
         """
         初始化状态存储
         
         Args:
             filename: 存储文件名
             max_history_minutes: 保留历史数据的时间（分钟）
+            max_history_points: 每个 key 最多保留的历史记录数，默认按每秒一条计算
+                （同一秒内的记录会被去重，因此默认值不会丢弃保留时间内的数据）
+            compress: 快照是否使用 zstd（level 1）压缩，需要安装 zstandard；
+                压缩快照写入 "<filename>.zst"（如 state_store.json.zst），不覆盖 JSON 文件
         """
         self.filename = Path(filename)
         self.max_history_minutes = max_history_minutes
+        self.max_history_points = max_history_points or max_history_minutes * 60
+        # 压缩器/解压器只创建一次，快照写入时复用
+        self._compressor = None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+        if compress:
+            if zstandard is None:
+                logger.warning("未安装 zstandard，状态快照不压缩")
+            else:
+                self._compressor = zstandard.ZstdCompressor(level=1)
+        self.compressed_filename = self.filename.with_name(self.filename.name + ".zst")
+        # 快照写入的文件：压缩时为 .zst 文件，否则为 JSON 文件
+        self.snapshot_filename = self.compressed_filename if self._compressor is not None else self.filename
+        self.journal_filename = self.filename.with_suffix(".journal")
         self.state: Dict[str, Any] = {}
+        # 尚未写入日志文件的修改记录（每条为一行 JSON）
+        self._pending_records: List[bytes] = []
+        # 追加日志时复用的写缓冲区
+        self._write_buffer = bytearray()
+        self._last_flush = time.monotonic()
+        self._last_compact = time.monotonic()
+        # batch() 嵌套深度，大于 0 时推迟写入
+        self._batch_depth = 0
+        # 上次写入快照内容的 BLAKE2b 摘要（本进程内），用于跳过内容未变化的写入
+        self._last_saved_digest: Optional[bytes] = None
         self.load_state()
+        self._journal = self._open_journal()
+        # 正常退出时写入未保存的修改
+        atexit.register(self.flush)
+    
+    def _existing_snapshot(self) -> Optional[Path]:
+        """
+        找到要加载的快照文件
+        
+        JSON 快照和压缩快照都接受，切换 compress 后旧格式的文件仍能读取；
+        两者同时存在时（写入新快照后、删除旧文件前崩溃）使用较新的文件。
+        
+        Returns:
+            快照文件路径，都不存在时返回 None
+        """
+        candidates = [path for path in (self.filename, self.compressed_filename) if path.exists()]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda path: path.stat().st_mtime_ns)
     
     def load_state(self) -> None:
         """从文件加载状态"""
-        if self.filename.exists():
+        snapshot_file = self._existing_snapshot()
+        if snapshot_file is not None:
             try:
-                with open(self.filename, "r", encoding="utf-8") as f:
-                    self.state = json.load(f)
-                logger.info(f"从 {self.filename} 加载状态成功")
+                with open(snapshot_file, "rb") as f:
+                    if os.fstat(f.fileno()).st_size < _MMAP_MIN_BYTES:
+                        self.state = self._decode_snapshot(f.read())
+                    else:
+                        # 大文件直接从页缓存解析，不额外复制一份文件内容
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                            with memoryview(mm) as view:
+                                self.state = self._decode_snapshot(view)
+                logger.info(f"从 {snapshot_file} 加载状态成功")
             except Exception as e:
                 logger.error(f"加载状态文件失败: {e}")
                 self.state = {}
         else:
-            logger.info(f"状态文件不存在，创建新文件: {self.filename}")
+            logger.info(f"状态文件不存在，创建新文件: {self.snapshot_filename}")
             self.state = {}
+        
+        self._replay_journal()
+    
+    def _open_journal(self):
+        """
+        打开日志文件：追加模式、无缓冲，每次 flush 的所有记录一次 write 写出
+        
+        优先使用 O_DSYNC，让每次 write 返回时数据已落盘，不需要额外的 fsync；
+        平台不支持时在写入后显式调用 fdatasync。
+        """
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        self._journal_dsync = False
+        if _O_DSYNC:
+            try:
+                fd = os.open(self.journal_filename, flags | _O_DSYNC, 0o644)
+                self._journal_dsync = True
+            except OSError as e:
+                logger.warning(f"日志文件不支持 O_DSYNC，改为写入后 fdatasync: {e}")
+                fd = os.open(self.journal_filename, flags, 0o644)
+        else:
+            fd = os.open(self.journal_filename, flags, 0o644)
+        return os.fdopen(fd, "ab", buffering=0)
+    
+    def _decode_snapshot(self, data: Any) -> Dict[str, Any]:
+        """
+        解析快照内容
+        
+        根据文件头识别压缩快照（也兼容早期直接写入 JSON 文件名的压缩快照）
+        
+        Args:
+            data: 快照内容（bytes 或 memoryview）
+            
+        Returns:
+            状态字典
+        """
+        if data[:4] == _ZSTD_MAGIC:
+            if self._decompressor is None:
+                raise RuntimeError("状态文件已使用 zstd 压缩，但未安装 zstandard")
+            data = self._decompressor.decompress(data)
+        return _loads_state(data)
+    
+    def _replay_journal(self) -> None:
+        """将上次快照之后追加的日志记录重放到内存状态"""
+        if not self.journal_filename.exists():
+            return
+        
+        replayed = 0
+        try:
+            with open(self.journal_filename, "rb") as f:
+                for line in f:
+                    try:
+                        record = _loads_state(line)
+                    except ValueError:
+                        # 写入中途崩溃只会损坏最后一行
+                        logger.warning(f"日志文件 {self.journal_filename} 末尾记录不完整，已忽略")
+                        break
+                    if "a" in record:
+                        self._apply_last_alert_time(record["a"], record["t"])
+                    else:
+                        self._apply_set(record["k"], record["v"], record["t"])
+                    replayed += 1
+        except Exception as e:
+            logger.error(f"重放日志文件失败: {e}")
+            return
+        
+        if replayed:
+            logger.info(f"从 {self.journal_filename} 重放 {replayed} 条记录")
     
     def save_state(self) -> None:
-        """保存状态到文件"""
+        """保存完整快照到文件，并清空日志文件（压缩）"""
         try:
             # 清理过期数据
             self._cleanup_old_data()
             
-            with open(self.filename, "w", encoding="utf-8") as f:
-                json.dump(self.state, f, indent=2, ensure_ascii=False)
+            data = _dumps_state(self.state)
+            # 内容与上次写入的快照相同时跳过文件写入（不做 fsync/replace）
+            # 使用加密摘要而不是内置 hash，避免碰撞导致真实修改被跳过
+            data_digest = hashlib.blake2b(data, digest_size=32).digest()
+            if data_digest != self._last_saved_digest:
+                if self._compressor is not None:
+                    data = self._compressor.compress(data)
+                self._write_atomic(data)
+                self._last_saved_digest = data_digest
+                # 切换 compress 后删除另一种格式的旧快照，加载时不会读到过期数据
+                stale_file = self.filename if self.snapshot_filename != self.filename else self.compressed_filename
+                if stale_file.exists():
+                    stale_file.unlink()
+            # 快照已包含所有修改，日志可以清空
+            self._pending_records.clear()
+            os.ftruncate(self._journal.fileno(), 0)
+            self._journal.seek(0)
+            now = time.monotonic()
+            self._last_flush = now
+            self._last_compact = now
         except Exception as e:
             logger.error(f"保存状态文件失败: {e}")
     
+    def compact(self) -> None:
+        """重写完整快照并清空日志文件"""
+        self.save_state()
+    
+    def _write_atomic(self, data: bytes) -> None:
+        """
+        先写临时文件并 fsync，再用 os.replace 原子替换，写入中途崩溃不会损坏原文件
+        
+        Args:
+            data: 序列化后的完整状态
+        """
+        tmp_file = self.snapshot_filename.with_name(self.snapshot_filename.name + ".tmp")
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # 整个状态一次 write 写出，极少数情况下的部分写入继续写剩余部分
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_file, self.snapshot_filename)
+    
+    def dump_pretty(self) -> str:
+        """返回格式化（缩进）的状态 JSON，便于人工查看"""
+        return json.dumps(self.state, indent=2, ensure_ascii=False, default=list)
+    
+    def flush(self) -> None:
+        """立即将未保存的修改追加到日志文件，日志过大或过久时压缩为快照"""
+        if self._pending_records:
+            self._append_journal()
+        
+        if (
+            self._journal.tell() >= _JOURNAL_COMPACT_BYTES
+            or time.monotonic() - self._last_compact >= _COMPACT_INTERVAL_SECONDS
+        ):
+            self.save_state()
+    
+    def _append_journal(self) -> None:
+        """将待写入的记录一次性追加到日志文件"""
+        records, self._pending_records = self._pending_records, []
+        # 复用同一个缓冲区拼接记录，避免每次 flush 分配新的 bytes
+        buffer = self._write_buffer
+        buffer.clear()
+        for record in records:
+            buffer += record
+            buffer += b"\n"
+        try:
+            self._journal.write(buffer)
+            if not self._journal_dsync:
+                _fdatasync(self._journal.fileno())
+            self._last_flush = time.monotonic()
+        except Exception as e:
+            logger.error(f"写入日志文件失败: {e}，改为保存完整快照")
+            self.save_state()
+        finally:
+            # 偶尔的大批量写入后释放缓冲区，避免长期占用内存
+            if len(buffer) > _WRITE_BUFFER_SOFT_MAX:
+                self._write_buffer = bytearray()
+    
+    @contextmanager
+    def batch(self) -> Iterator["StateStore"]:
+        """
+        批量更新：块内的修改只在退出时写入一次文件
+        
+        用法:
+            with store.batch():
+                store.set(...)
+                store.set(...)
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+    
+    def _mark_dirty(self, record: Dict[str, Any]) -> None:
+        """
+        记录一次修改，累计次数或间隔达到阈值时写入日志文件
+        
+        Args:
+            record: 日志记录，{"k", "v", "t"} 为 set，{"a", "t"} 为告警时间
+        """
+        self._pending_records.append(_dumps_state(record))
+        if self._batch_depth:
+            return
+        if (
+            len(self._pending_records) >= _FLUSH_EVERY_N
+            or time.monotonic() - self._last_flush >= _FLUSH_INTERVAL_SECONDS
+        ):
+            self.flush()
+    
     def _cleanup_old_data(self) -> None:
         """清理过期的历史数据"""
-        current_time = time.time()
-        cutoff_time = current_time - (self.max_history_minutes * 60)
+        cutoff_time = time.time() - (self.max_history_minutes * 60)
+        state = self.state
         
-        for key in list(self.state.keys()):
+        for key, data in list(state.items()):
             if key.startswith("_") or key == "last_alert_times":
                 continue
             
-            data = self.state[key]
-            
             # 如果是历史记录列表，清理过期项
             if isinstance(data, dict) and "history" in data:
                 history = data["history"]
-                if isinstance(history, list):
-                    data["history"] = [
-                        item for item in history
-                        if item.get("timestamp", 0) >= cutoff_time
-                    ]
+                if isinstance(history, (list, deque)):
+                    # 历史按时间升序，过期项是连续的前缀，二分查找其长度后就地删除
+                    expired = bisect.bisect_left(history, cutoff_time, key=_timestamp_of)
+                    if expired:
+                        if isinstance(history, list):
+                            del history[:expired]
+                        else:
+                            popleft = history.popleft
+                            for _ in range(expired):
+                                popleft()
+                    
                     # 如果历史为空，且没有最新值，删除整个 key
                     if not data["history"] and "latest" not in data:
-                        del self.state[key]
+                        del state[key]
             elif isinstance(data, dict) and "timestamp" in data:
                 # 单条记录，检查是否过期
-                if data.get("timestamp", 0) < cutoff_time:
-                    del self.state[key]
+                if data["timestamp"] < cutoff_time:
+                    del state[key]
     
     def get_latest(self, key: str) -> Optional[Dict[str, Any]]:
         """
@@ -91,11 +397,11 @@ class StateStore:
         if data is None:
             return None
         
-        # 如果有历史记录，返回最新的
+        # 如果有历史记录，返回最新的（历史按时间升序保存，最后一条即最新）
         if isinstance(data, dict) and "history" in data:
             history = data.get("history", [])
             if history:
-                latest = sorted(history, key=lambda x: x.get("timestamp", 0))[-1]
+                latest = history[-1]
                 return {
                     "value": latest.get("value"),
                     "timestamp": latest.get("timestamp")
@@ -126,13 +432,11 @@ class StateStore:
         current_time = time.time()
         cutoff_time = current_time - (minutes * 60)
         
-        # 如果是历史记录格式
+        # 如果是历史记录格式（按时间升序），二分查找窗口起点后截取
         if isinstance(data, dict) and "history" in data:
-            history = data.get("history", [])
-            return [
-                item for item in history
-                if item.get("timestamp", 0) >= cutoff_time
-            ]
+            history = data.get("history") or []
+            start = bisect.bisect_left(history, cutoff_time, key=_timestamp_of)
+            return list(islice(history, start, None))
         
         # 单条记录
         if isinstance(data, dict) and "timestamp" in data:
@@ -141,6 +445,56 @@ class StateStore:
         
         return []
     
+    def get_nearest(
+        self,
+        key: str,
+        target_time: float,
+        min_timestamp: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        获取最接近指定时间点的历史记录
+        
+        历史记录在 set() 中已按时间戳升序保存，这里用二分查找定位，
+        只比较目标时间两侧的相邻记录。
+        
+        Args:
+            key: 数据键
+            target_time: 目标时间戳
+            min_timestamp: 只在时间戳 >= 该值的记录中查找（默认不限制）
+            
+        Returns:
+            最接近的记录（包含 value 和 timestamp），不存在返回 None
+        """
+        data = self.state.get(key)
+        
+        if not isinstance(data, dict):
+            return None
+        
+        if "history" not in data:
+            # 单条记录
+            if "timestamp" in data and (min_timestamp is None or data.get("timestamp", 0) >= min_timestamp):
+                return data
+            return None
+        
+        history = data.get("history") or []
+        timestamp_of = _timestamp_of
+        lo = 0 if min_timestamp is None else bisect.bisect_left(history, min_timestamp, key=timestamp_of)
+        if lo >= len(history):
+            return None
+        
+        index = bisect.bisect_left(history, target_time, lo=lo, key=timestamp_of)
+        if index >= len(history):
+            return history[-1]
+        if index == lo:
+            return history[index]
+        
+        # 距离相同时取较早的记录
+        before = history[index - 1]
+        after = history[index]
+        if target_time - timestamp_of(before) <= timestamp_of(after) - target_time:
+            return before
+        return after
+    
     def get_value_at_time(self, key: str, target_time: float) -> Optional[Any]:
         """
         获取指定时间点的数据（最接近的）
@@ -152,13 +506,14 @@ class StateStore:
         Returns:
             最接近时间点的数据值
         """
-        history = self.get_history(key, minutes=self.max_history_minutes)
+        closest = self.get_nearest(
+            key,
+            target_time,
+            min_timestamp=time.time() - self.max_history_minutes * 60
+        )
         
-        if not history:
+        if closest is None:
             return None
-        
-        # 找到最接近目标时间的记录
-        closest = min(history, key=lambda x: abs(x.get("timestamp", 0) - target_time))
         return closest.get("value")
     
     def set(self, key: str, value: Any, timestamp: Optional[float] = None) -> None:
@@ -173,32 +528,49 @@ class StateStore:
         if timestamp is None:
             timestamp = time.time()
         
-        # 如果是第一次设置，初始化结构
-        if key not in self.state:
+        self._apply_set(key, value, timestamp)
+        self._mark_dirty({"k": key, "v": value, "t": timestamp})
+    
+    def _apply_set(self, key: str, value: Any, timestamp: float) -> None:
+        """更新内存中的数据值（set 和日志重放共用）"""
+        # latest 与历史记录共用同一个记录对象（记录创建后不再修改），每次只分配一个 dict
+        record = {"value": value, "timestamp": timestamp}
+        data = self.state.get(key)
+        
+        # 如果是第一次设置或旧格式，初始化结构
+        if not isinstance(data, dict):
             self.state[key] = {
-                "latest": {"value": value, "timestamp": timestamp},
-                "history": [{"value": value, "timestamp": timestamp}]
+                "latest": record,
+                "history": deque((record,), maxlen=self.max_history_points)
             }
-        else:
-            # 更新最新值
-            if isinstance(self.state[key], dict):
-                self.state[key]["latest"] = {"value": value, "timestamp": timestamp}
-                # 添加到历史记录（去重：如果时间戳相同则更新）
-                history = self.state[key].get("history", [])
-                # 移除相同时间戳的记录（如果有）
-                history = [h for h in history if abs(h.get("timestamp", 0) - timestamp) > 1]
-                history.append({"value": value, "timestamp": timestamp})
-                # 按时间戳排序
-                history.sort(key=lambda x: x.get("timestamp", 0))
-                self.state[key]["history"] = history
-            else:
-                # 旧格式，转换为新格式
-                self.state[key] = {
-                    "latest": {"value": value, "timestamp": timestamp},
-                    "history": [{"value": value, "timestamp": timestamp}]
-                }
+            return
         
-        self.save_state()
+        # 更新最新值
+        data["latest"] = record
+        
+        # 历史记录在内存中为有界 deque（从文件加载的列表在首次更新时转换）
+        history = data.get("history")
+        if not isinstance(history, deque):
+            history = deque(history or (), maxlen=self.max_history_points)
+            data["history"] = history
+        
+        if not history or timestamp > history[-1]["timestamp"] + 1:
+            # 正常情况：时间戳单调递增，直接追加
+            history.append(record)
+            return
+        
+        # 时间戳与已有记录相同（1 秒内）或乱序：就地移除 1 秒内的记录，再插入到有序位置
+        lo = bisect.bisect_left(history, timestamp - 1, key=_timestamp_of)
+        hi = bisect.bisect_right(history, timestamp + 1, lo=lo, key=_timestamp_of)
+        for _ in range(hi - lo):
+            del history[lo]
+        if len(history) == history.maxlen:
+            if lo == 0:
+                # 比保留的所有记录都旧，超出容量直接丢弃
+                return
+            history.popleft()
+            lo -= 1
+        history.insert(lo, record)
     
     def get_last_alert_time(self, alert_key: str) -> Optional[float]:
         """
@@ -210,14 +582,18 @@ class StateStore:
         Returns:
             上次告警时间戳，不存在返回 None
         """
-        if "last_alert_times" not in self.state:
+        last_alert_times = self.state.get("last_alert_times")
+        if last_alert_times is None:
             return None
-        return self.state["last_alert_times"].get(alert_key)
+        return last_alert_times.get(alert_key)
     
     def set_last_alert_time(self, alert_key: str, timestamp: Optional[float] = None) -> None:
         """
         设置上次告警时间
         
+        持久化的是墙上时间（time.time()），用于重启后恢复冷却状态；
+        单调时钟的值在进程重启后没有意义，不应写入这里。
+        
         Args:
             alert_key: 告警键
             timestamp: 时间戳（默认当前时间）
@@ -225,9 +601,13 @@ class StateStore:
         if timestamp is None:
             timestamp = time.time()
         
+        self._apply_last_alert_time(alert_key, timestamp)
+        self._mark_dirty({"a": alert_key, "t": timestamp})
+    
+    def _apply_last_alert_time(self, alert_key: str, timestamp: float) -> None:
+        """更新内存中的告警时间（set_last_alert_time 和日志重放共用）"""
         if "last_alert_times" not in self.state:
             self.state["last_alert_times"] = {}
         
         self.state["last_alert_times"][alert_key] = timestamp
-        self.save_state()
 
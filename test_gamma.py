@@ -1,7 +1,7 @@
 """测试脚本 - 专门抓取 Gamma 值"""
 import os
 import sys
-import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from loguru import logger
 
@@ -10,12 +10,12 @@ load_dotenv()
 
 # 导入项目模块
 from config import load_config
-from deribit_client import DeribitClient
+from deribit_client import DeribitClient, format_json
 
 # 配置日志
 logger.remove()
 logger.add(
-    lambda msg: print(msg, end=""),
+    sys.stderr,
     level="INFO",
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>"
 )
@@ -70,7 +70,7 @@ def test_gamma():
             logger.info("-" * 80)
             logger.info("get_order_book API 返回的完整数据:")
             logger.info("-" * 80)
-            logger.info(json.dumps(result_orderbook, indent=2, ensure_ascii=False))
+            logger.info(format_json(result_orderbook))
             logger.info("")
             
             # 提取可能的 Greeks 字段
@@ -89,7 +89,7 @@ def test_gamma():
                 logger.info("")
                 logger.info("greeks 字段内容:")
                 if isinstance(greeks_orderbook, dict):
-                    logger.info(json.dumps(greeks_orderbook, indent=2, ensure_ascii=False))
+                    logger.info(format_json(greeks_orderbook))
                     if "gamma" in greeks_orderbook:
                         logger.info(f"")
                         logger.info(f"✓ 找到 Gamma: {greeks_orderbook.get('gamma')}")
@@ -108,16 +108,20 @@ def test_gamma():
         currencies = ["BTC", "USDC", "ETH"]
         all_positions_raw = []
         
-        for currency in currencies:
-            logger.info(f"正在获取 {currency} 期权持仓...")
-            method_name = "private/get_positions"
-            params = {
-                "currency": currency,
-                "kind": "option"
-            }
-            
-            result = client._make_request(method_name, params=params)
-            
+        logger.info(f"正在并发获取 {', '.join(currencies)} 期权持仓...")
+        method_name = "private/get_positions"
+        
+        # 各币种请求相互独立，并发发出，总耗时约为单次往返
+        with ThreadPoolExecutor(max_workers=len(currencies)) as executor:
+            results = list(executor.map(
+                lambda currency: client._make_request(
+                    method_name,
+                    params={"currency": currency, "kind": "option"}
+                ),
+                currencies
+            ))
+        
+        for currency, result in zip(currencies, results):
             if result is None:
                 logger.info(f"  {currency}: API 返回 None")
                 continue
@@ -132,12 +136,14 @@ def test_gamma():
         logger.info(f"总共获取到 {len(all_positions_raw)} 个持仓记录")
         logger.info("")
         
-        # 查找目标合约
-        target_position = None
+        # 按合约名称建立查找索引（同名合约保留第一次出现的记录）
+        positions_by_name = {}
         for pos in all_positions_raw:
-            if pos.get("instrument_name", "") == target_instrument:
-                target_position = pos
-                break
+            if "instrument_name" in pos:
+                positions_by_name.setdefault(pos["instrument_name"], pos)
+        
+        # 查找目标合约
+        target_position = positions_by_name.get(target_instrument)
         
         if target_position:
             logger.info("=" * 80)
@@ -149,7 +155,7 @@ def test_gamma():
             logger.info("-" * 80)
             logger.info("持仓 API 返回的完整数据 (JSON):")
             logger.info("-" * 80)
-            logger.info(json.dumps(target_position, indent=2, ensure_ascii=False))
+            logger.info(format_json(target_position))
             logger.info("")
             
             # 提取关键信息
@@ -190,7 +196,7 @@ def test_gamma():
         
         logger.info("Greeks 数据:")
         if greeks:
-            logger.info(json.dumps(greeks, indent=2, ensure_ascii=False))
+            logger.info(format_json(greeks))
         else:
             logger.warning("  Greeks 数据为空！")
         logger.info("")
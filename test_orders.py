@@ -2,28 +2,326 @@
 import os
 import sys
 import json
+import time
+import heapq
+import hashlib
+import argparse
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 from loguru import logger
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # 加载 .env 文件
 load_dotenv()
 
 # 导入项目模块
 from config import load_config
-from deribit_client import DeribitClient
+from deribit_client import DeribitClient, format_json
 
 # 配置日志
 logger.remove()
 logger.add(
-    lambda msg: print(msg, end=""),
+    sys.stderr,
     level="INFO",
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>"
 )
 
+# API 响应缓存文件：反复运行脚本调试输出格式时复用最近的结果
+_CACHE_FILE = Path(__file__).with_name("test_orders.cache.json")
+
+# 各方法的缓存有效期（秒）：挂单变化快，历史交易基本不变
+_CACHE_TTL = {
+    "private/get_account_summaries": 300,
+    "private/get_open_orders": 30,
+    "private/get_user_trades_by_currency": 300,
+}
+
+
+def _cache_key(client: DeribitClient, method: str, params: Dict[str, Any]) -> str:
+    """
+    计算缓存键，包含账户和 API 地址，切换账户或测试/生产环境时不会读到其他账户的数据
+    
+    Args:
+        client: Deribit 客户端
+        method: API 方法名
+        params: 请求参数
+        
+    Returns:
+        缓存键（十六进制 SHA-256）
+    """
+    raw = json.dumps([client.client_id, client.base_url, method, params], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _load_cache() -> Dict[str, Dict[str, Any]]:
+    """读取响应缓存，文件不存在或损坏时返回空缓存"""
+    try:
+        return json.loads(_CACHE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache: Dict[str, Dict[str, Any]], max_age: float):
+    """
+    清除过期条目后原子写入响应缓存，写入失败不影响测试
+    
+    Args:
+        cache: 响应缓存
+        max_age: 条目的最长保留时间（秒），超过的条目不再写入
+    """
+    now = time.time()
+    cache = {key: entry for key, entry in cache.items() if now - entry.get("time", 0) < max_age}
+    try:
+        tmp_file = _CACHE_FILE.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_file, _CACHE_FILE)
+    except OSError as e:
+        logger.debug(f"写入响应缓存失败: {e}")
+
+
+def _fetch_calls(client: DeribitClient, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+    """
+    并发获取多个 API 调用的结果（开启 batch_requests 时优先合并为一次批量请求）
+    
+    Args:
+        client: Deribit 客户端
+        calls: (method, params) 列表
+        
+    Returns:
+        与 calls 顺序一致的结果列表，失败的调用为 None
+    """
+    if not calls:
+        return []
+    
+    def call_safely(call):
+        # _make_request 自带退避重试（限流、5xx、超时、连接错误）
+        try:
+            return client._make_request(call[0], params=call[1])
+        except Exception as e:
+            logger.warning(f"  ✗ {call[1].get('currency', '全部币种')}: {call[0]} 请求失败 - {e}")
+            return None
+    
+    # 开启 batch_requests 时合并为一次 JSON-RPC 批量请求
+    batch_results = client._make_batch_request(calls)
+    if batch_results is not None:
+        results = [batch_results.get(index) for index in range(len(calls))]
+        # 批量中个别子请求出错（例如被限流）时只重试这些调用，而不是丢掉该币种的数据
+        failed = [index for index in range(len(calls)) if index not in batch_results]
+        if failed:
+            logger.info(f"批量请求中 {len(failed)} 个子请求失败，逐个重试")
+            with ThreadPoolExecutor(max_workers=len(failed)) as executor:
+                for index, result in zip(failed, executor.map(call_safely, [calls[i] for i in failed])):
+                    results[index] = result
+        return results
+    
+    # 未开启或批量请求不可用时并发逐个请求，总耗时约为最慢的一次往返
+    logger.debug("批量请求不可用，并发逐个请求")
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        return list(executor.map(call_safely, calls))
+
+
+def _per_currency_calls(
+    method: str,
+    currencies: List[str],
+    extra_params: Optional[Dict[str, Any]] = None
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    为每个币种构造同一方法的 (method, params) 调用
+    
+    Args:
+        method: API 方法名
+        currencies: 币种列表
+        extra_params: 各调用共用的其他参数
+        
+    Returns:
+        与 currencies 顺序一致的调用列表
+    """
+    return [(method, {"currency": currency, **(extra_params or {})}) for currency in currencies]
+
+
+def _fetch_calls_cached(
+    client: DeribitClient,
+    calls: List[Tuple[str, Dict[str, Any]]],
+    use_cache: bool = False,
+    cache_ttl: Optional[float] = None
+) -> List[Any]:
+    """
+    获取多个 API 调用的结果，未过期的结果直接取自本地缓存，只请求缓存未命中的部分
+    
+    Args:
+        client: Deribit 客户端
+        calls: (method, params) 列表
+        use_cache: 是否使用响应缓存
+        cache_ttl: 统一的缓存有效期（秒），None 表示按方法使用 _CACHE_TTL
+        
+    Returns:
+        与 calls 顺序一致的结果列表，失败的调用为 None
+    """
+    if not use_cache:
+        return _fetch_calls(client, calls)
+    
+    cache = _load_cache()
+    now = time.time()
+    keys = [_cache_key(client, method, params) for method, params in calls]
+    results: List[Any] = [None] * len(calls)
+    missing = []
+    
+    for index, ((method, _), key) in enumerate(zip(calls, keys)):
+        ttl = cache_ttl if cache_ttl is not None else _CACHE_TTL.get(method, 0)
+        entry = cache.get(key)
+        if entry is not None and now - entry.get("time", 0) < ttl:
+            results[index] = entry.get("result")
+        else:
+            missing.append(index)
+    
+    if len(missing) < len(calls):
+        logger.info(f"响应缓存命中 {len(calls) - len(missing)}/{len(calls)} 个请求")
+    if not missing:
+        return results
+    
+    fetched = _fetch_calls(client, [calls[index] for index in missing])
+    for index, result in zip(missing, fetched):
+        results[index] = result
+        # 失败的请求不写入缓存，下次运行重新获取
+        if result is not None:
+            cache[keys[index]] = {"time": now, "result": result}
+    _save_cache(cache, max(max(_CACHE_TTL.values()), cache_ttl or 0))
+    
+    return results
+
+# 无法获取账户余额时查询交易历史的默认币种
+_DEFAULT_CURRENCIES = ["BTC", "ETH", "USDC", "USDT"]
+
+# 详细显示的最近交易笔数
+_TRADE_DISPLAY_LIMIT = 20
+
+# 挂单/交易详情模板：每条记录格式化为一条多行日志
+_ORDER_TEMPLATE = (
+    "\n[{i}] 挂单详情:\n"
+    "  订单ID: {order_id}\n"
+    "  合约: {instrument}\n"
+    "  币种: {currency} | 类型: {kind}\n"
+    "  方向: {direction} | 价格: {price:.2f}\n"
+    "  数量: {amount:.4f} | 已成交: {filled:.4f} | 剩余: {remaining:.4f} ({fill_pct:.1f}%)\n"
+    "  订单类型: {order_type} | 状态: {order_state}\n"
+    "  创建时间: {creation_time}"
+)
+_TRADE_TEMPLATE = (
+    "\n[{i}] 交易详情:\n"
+    "  交易ID: {trade_id}\n"
+    "  合约: {instrument}\n"
+    "  币种: {currency} | 类型: {kind}\n"
+    "  方向: {direction} | 价格: {price:.2f} | 数量: {amount:.4f}\n"
+    "  手续费: {fee:.8f} | 交易类型: {trade_type}\n"
+    "  时间: {trade_time}"
+)
+
+
+def _write_jsonl(path: Path, records: List[Dict[str, Any]]):
+    """
+    把记录逐行写入 JSONL 文件（每行一个 JSON 对象），供后续工具处理
+    
+    Args:
+        path: 输出文件路径
+        records: 挂单或交易记录列表
+    """
+    with open(path, "wb") as f:
+        for record in records:
+            if orjson is not None:
+                f.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS))
+            else:
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+def _as_float(value: Any, default: float = 0.0) -> float:
+    """
+    把 API 返回的数值字段转换为 float，用于格式化输出
+    
+    市价单的 price 为字符串 "market_price"，部分字段可能为 None，
+    这些非数值一律按 default 处理，避免 :.2f 等格式化抛出异常
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    return default
+
 
-def test_get_all_orders():
-    """测试获取所有挂单和交易信息（不分币种）"""
+def _trade_timestamp(trade: Dict[str, Any]) -> float:
+    """交易时间戳（兼容 timestamp / trade_timestamp 两种字段）"""
+    return trade.get("timestamp", 0) or trade.get("trade_timestamp", 0)
+
+
+@lru_cache(maxsize=4096)
+def _format_timestamp(ts: float) -> str:
+    """
+    格式化 API 返回的时间戳（自动识别毫秒/秒）为本地时间字符串
+    
+    Args:
+        ts: 毫秒或秒级时间戳
+        
+    Returns:
+        "%Y-%m-%d %H:%M:%S" 格式的时间，无效时间戳返回 "N/A"
+    """
+    if ts > 1000000000000:  # 毫秒
+        ts = ts / 1000
+    elif ts <= 0:
+        return "N/A"
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def _active_currencies(
+    client: DeribitClient,
+    use_cache: bool = False,
+    cache_ttl: Optional[float] = None
+) -> List[str]:
+    """
+    通过账户汇总找出有余额的币种，只查询这些币种的交易历史
+    
+    Args:
+        client: Deribit 客户端
+        use_cache: 是否使用响应缓存
+        cache_ttl: 统一的缓存有效期（秒），None 表示按方法使用默认值
+        
+    Returns:
+        有余额或权益的币种列表，查询失败或没有时返回默认币种列表
+    """
+    summaries = _fetch_calls_cached(
+        client, [("private/get_account_summaries", {})], use_cache=use_cache, cache_ttl=cache_ttl
+    )[0]
+    if not isinstance(summaries, dict):
+        logger.info("获取账户汇总失败，使用默认币种列表")
+        return _DEFAULT_CURRENCIES
+    
+    currencies = [
+        summary["currency"]
+        for summary in summaries.get("summaries", [])
+        if summary.get("currency") and (_as_float(summary.get("balance")) > 0 or _as_float(summary.get("equity")) > 0)
+    ]
+    return currencies or _DEFAULT_CURRENCIES
+
+
+def test_get_all_orders(
+    use_cache: bool = False,
+    cache_ttl: Optional[float] = None,
+    currencies: Optional[List[str]] = None,
+    export_dir: Optional[str] = None
+):
+    """
+    测试获取所有挂单和交易信息（不分币种）
+    
+    Args:
+        use_cache: 是否使用本地响应缓存
+        cache_ttl: 统一的缓存有效期（秒），None 表示按方法使用默认值
+        currencies: 查询交易历史的币种，None 表示自动选择有余额的币种
+        export_dir: 导出 orders.jsonl / trades.jsonl 的目录，None 表示不导出
+    """
     
     logger.info("=" * 80)
     logger.info("Deribit 挂单和交易测试工具 - 查看所有信息（不分币种）")
@@ -40,41 +338,53 @@ def test_get_all_orders():
         client = DeribitClient(
             client_id=deribit_config.get("client_id", ""),
             client_secret=deribit_config.get("client_secret", ""),
-            base_url=deribit_config.get("base_url", "https://www.deribit.com")
+            base_url=deribit_config.get("base_url", "https://www.deribit.com"),
+            # 反复运行脚本时复用未过期的 token，省去每次启动的认证往返
+            token_cache_file=os.path.expanduser("~/.deribit_token.json"),
+            batch_requests=deribit_config.get("batch_requests", False)
         )
         
         logger.info("认证成功！")
         logger.info("")
         
-        # 获取所有币种的挂单
-        currencies = ["BTC", "ETH", "USDC", "USDT"]  # 常见的币种
+        # 交易历史仍按币种获取，未指定时只查询有余额的币种
+        if not currencies:
+            currencies = _active_currencies(client, use_cache=use_cache, cache_ttl=cache_ttl)
         all_orders = []
         
+        # 不带 currency 参数的 get_open_orders 一次返回所有币种的挂单
+        method_name = "private/get_open_orders"
+        method_name_trades = "private/get_user_trades_by_currency"
+        
+        # 挂单和交易历史走同一条获取路径（批量请求、并发回退、响应缓存）
+        calls = [(method_name, {})] + _per_currency_calls(method_name_trades, currencies, {
+            "count": 50,  # 获取最近 50 笔交易
+            "include_old": True  # 包含历史交易
+        })
+        
+        logger.info(f"正在获取所有挂单和 {', '.join(currencies)} 的交易历史...")
+        logger.info("")
+        results = _fetch_calls_cached(client, calls, use_cache=use_cache, cache_ttl=cache_ttl)
+        result = results[0]
+        trade_results = results[1:]
+        
         logger.info("-" * 80)
         logger.info("第一部分: 获取所有币种的挂单")
         logger.info("-" * 80)
         logger.info("")
         
-        method_name = "private/get_open_orders_by_currency"
-        
-        for currency in currencies:
-            logger.info(f"正在获取 {currency} 挂单...")
-            params = {"currency": currency}
-            
-            result = client._make_request(method_name, params=params)
-            
-            if result is not None:
-                if isinstance(result, list):
-                    count = len(result)
-                    logger.info(f"  ✓ {currency}: {count} 个挂单")
-                    all_orders.extend(result)
-                elif isinstance(result, dict):
-                    logger.info(f"  ✓ {currency}: 1 个挂单（字典格式）")
-                    all_orders.append(result)
-                else:
-                    logger.warning(f"  ✗ {currency}: 返回格式异常 - {type(result)}")
+        if result is not None:
+            if isinstance(result, list):
+                count = len(result)
+                logger.info(f"  ✓ 全部币种: {count} 个挂单")
+                all_orders.extend(result)
+            elif isinstance(result, dict):
+                logger.info(f"  ✓ 全部币种: 1 个挂单（字典格式）")
+                all_orders.append(result)
             else:
-                logger.info(f"  - {currency}: 没有挂单或 API 返回 None")
+                logger.warning(f"  ✗ 全部币种: 返回格式异常 - {type(result)}")
+        else:
+            logger.info(f"  - 全部币种: 没有挂单或 API 返回 None")
         
         logger.info("")
         
@@ -85,42 +395,29 @@ def test_get_all_orders():
         logger.info("")
         
         all_trades = []
-        method_name_trades = "private/get_user_trades_by_currency"
         
-        for currency in currencies:
-            logger.info(f"正在获取 {currency} 交易历史...")
-            params = {
-                "currency": currency,
-                "count": 50,  # 获取最近 50 笔交易
-                "include_old": True  # 包含历史交易
-            }
-            
-            try:
-                result = client._make_request(method_name_trades, params=params)
-                
-                if result is not None:
-                    # Deribit API 返回格式可能是字典或列表
-                    if isinstance(result, dict):
-                        if "trades" in result:
-                            trades = result["trades"]
-                        elif "result" in result:
-                            trades = result["result"]
-                        else:
-                            trades = [result]
-                    elif isinstance(result, list):
-                        trades = result
+        for currency, result in zip(currencies, trade_results):
+            if result is not None:
+                # Deribit API 返回格式可能是字典或列表
+                if isinstance(result, dict):
+                    if "trades" in result:
+                        trades = result["trades"]
+                    elif "result" in result:
+                        trades = result["result"]
                     else:
-                        trades = []
-                    
-                    count = len(trades) if isinstance(trades, list) else 0
-                    logger.info(f"  ✓ {currency}: {count} 笔交易")
-                    
-                    if isinstance(trades, list):
-                        all_trades.extend(trades)
+                        trades = [result]
+                elif isinstance(result, list):
+                    trades = result
                 else:
-                    logger.info(f"  - {currency}: 没有交易历史或 API 返回 None")
-            except Exception as e:
-                logger.warning(f"  ✗ {currency}: 获取交易失败 - {e}")
+                    trades = []
+                
+                count = len(trades) if isinstance(trades, list) else 0
+                logger.info(f"  ✓ {currency}: {count} 笔交易")
+                
+                if isinstance(trades, list):
+                    all_trades.extend(trades)
+            else:
+                logger.info(f"  - {currency}: 没有交易历史或 API 返回 None")
         
         logger.info("")
         
@@ -132,6 +429,14 @@ def test_get_all_orders():
         logger.info(f"总交易数: {len(all_trades)}")
         logger.info("")
         
+        if export_dir:
+            export_path = Path(export_dir)
+            export_path.mkdir(parents=True, exist_ok=True)
+            _write_jsonl(export_path / "orders.jsonl", all_orders)
+            _write_jsonl(export_path / "trades.jsonl", all_trades)
+            logger.info(f"挂单和交易已导出到 {export_path / 'orders.jsonl'} 和 {export_path / 'trades.jsonl'}")
+            logger.info("")
+        
         # 显示所有挂单
         if len(all_orders) == 0:
             logger.warning("⚠️  没有找到任何挂单！")
@@ -146,66 +451,63 @@ def test_get_all_orders():
             logger.info("详细挂单信息:")
             logger.info("-" * 80)
             
-            # 按币种分组
-            orders_by_currency = {}
-            orders_by_kind = {}
+            # 只在 DEBUG 模式下输出完整 JSON
+            debug_mode = config.get("general", {}).get("log_level", "INFO").upper() == "DEBUG"
             
             for i, order in enumerate(all_orders, 1):
-                currency = order.get("currency", "unknown")
-                kind = order.get("kind", "unknown")
-                instrument = order.get("instrument_name", "unknown")
-                direction = order.get("direction", "unknown").upper()
-                price = order.get("price", 0)
-                amount = order.get("amount", 0)
-                filled = order.get("filled_amount", 0)
+                get = order.get
+                currency = get("currency", "unknown")
+                kind = get("kind", "unknown")
+                instrument = get("instrument_name", "unknown")
+                direction = get("direction", "unknown").upper()
+                price = _as_float(get("price"))
+                amount = _as_float(get("amount"))
+                filled = _as_float(get("filled_amount"))
                 remaining = amount - filled
-                order_type = order.get("order_type", "unknown")
-                order_state = order.get("order_state", "unknown")
-                
-                # 统计
-                if currency not in orders_by_currency:
-                    orders_by_currency[currency] = []
-                orders_by_currency[currency].append(order)
-                
-                if kind not in orders_by_kind:
-                    orders_by_kind[kind] = []
-                orders_by_kind[kind].append(order)
+                order_type = get("order_type", "unknown")
+                order_state = get("order_state", "unknown")
                 
                 # 格式化时间
-                creation_ts = order.get("creation_timestamp", 0)
-                if creation_ts > 1000000000000:  # 毫秒
-                    creation_time = datetime.fromtimestamp(creation_ts / 1000).strftime("%Y-%m-%d %H:%M:%S")
-                elif creation_ts > 0:  # 秒
-                    creation_time = datetime.fromtimestamp(creation_ts).strftime("%Y-%m-%d %H:%M:%S")
-                else:
-                    creation_time = "N/A"
+                creation_time = _format_timestamp(get("creation_timestamp", 0))
                 
                 fill_pct = (filled / amount * 100) if amount > 0 else 0
                 
-                logger.info(f"\n[{i}] 挂单详情:")
-                logger.info(f"  订单ID: {order.get('order_id', 'N/A')}")
-                logger.info(f"  合约: {instrument}")
-                logger.info(f"  币种: {currency} | 类型: {kind}")
-                logger.info(f"  方向: {direction} | 价格: {price:.2f}")
-                logger.info(f"  数量: {amount:.4f} | 已成交: {filled:.4f} | 剩余: {remaining:.4f} ({fill_pct:.1f}%)")
-                logger.info(f"  订单类型: {order_type} | 状态: {order_state}")
-                logger.info(f"  创建时间: {creation_time}")
-                
-                # 只在 DEBUG 模式下输出完整 JSON
-                if config.get("general", {}).get("log_level", "INFO").upper() == "DEBUG":
-                    logger.info(f"  原始数据: {json.dumps(order, indent=2, ensure_ascii=False)}")
+                text = _ORDER_TEMPLATE.format(
+                    i=i,
+                    order_id=get("order_id", "N/A"),
+                    instrument=instrument,
+                    currency=currency,
+                    kind=kind,
+                    direction=direction,
+                    price=price,
+                    amount=amount,
+                    filled=filled,
+                    remaining=remaining,
+                    fill_pct=fill_pct,
+                    order_type=order_type,
+                    order_state=order_state,
+                    creation_time=creation_time
+                )
+                if debug_mode:
+                    text += f"\n  原始数据: {format_json(order)}"
+                logger.info(text)
             
             logger.info("")
             logger.info("-" * 80)
             logger.info("挂单统计信息:")
             logger.info("-" * 80)
+            
+            # 统计只需要数量，不保留各组的挂单列表
+            orders_by_currency = Counter(order.get("currency", "unknown") for order in all_orders)
+            orders_by_kind = Counter(order.get("kind", "unknown") for order in all_orders)
+            
             logger.info(f"按币种分组:")
-            for currency, orders in orders_by_currency.items():
-                logger.info(f"  {currency}: {len(orders)} 个挂单")
+            for currency, count in orders_by_currency.most_common():
+                logger.info(f"  {currency}: {count} 个挂单")
             
             logger.info(f"\n按合约类型分组:")
-            for kind, orders in orders_by_kind.items():
-                logger.info(f"  {kind}: {len(orders)} 个挂单")
+            for kind, count in orders_by_kind.most_common():
+                logger.info(f"  {kind}: {count} 个挂单")
             
             logger.info("")
         
@@ -216,72 +518,59 @@ def test_get_all_orders():
             logger.info("=" * 80)
             logger.info("")
             
-            # 按币种和类型分组
-            trades_by_currency = {}
-            trades_by_kind = {}
-            
-            # 按时间排序（最新的在前）
-            all_trades_sorted = sorted(
-                all_trades,
-                key=lambda x: x.get("timestamp", 0) or x.get("trade_timestamp", 0),
-                reverse=True
-            )
-            
-            # 只显示最近 20 笔交易的详细信息
-            display_count = min(20, len(all_trades_sorted))
+            # 只显示最近的交易，用堆取前 N 笔（最新的在前），无需对全部交易排序
+            recent_trades = heapq.nlargest(_TRADE_DISPLAY_LIMIT, all_trades, key=_trade_timestamp)
+            display_count = len(recent_trades)
             logger.info(f"显示最近 {display_count} 笔交易的详细信息：")
             logger.info("-" * 80)
             
-            for i, trade in enumerate(all_trades_sorted[:display_count], 1):
-                instrument = trade.get("instrument_name", "unknown")
-                currency = trade.get("currency", "unknown")
-                kind = trade.get("kind", "unknown")
-                direction = trade.get("direction", "unknown").upper()
-                price = trade.get("price", 0)
-                amount = trade.get("amount", 0) or trade.get("quantity", 0)
-                fee = trade.get("fee", 0)
-                trade_type = trade.get("trade_type", "unknown") or trade.get("order_type", "unknown")
+            for i, trade in enumerate(recent_trades, 1):
+                get = trade.get
+                instrument = get("instrument_name", "unknown")
+                currency = get("currency", "unknown")
+                kind = get("kind", "unknown")
+                direction = get("direction", "unknown").upper()
+                price = _as_float(get("price"))
+                amount = _as_float(get("amount")) or _as_float(get("quantity"))
+                fee = _as_float(get("fee"))
+                trade_type = get("trade_type", "unknown") or get("order_type", "unknown")
                 
                 # 格式化时间
-                trade_ts = trade.get("timestamp", 0) or trade.get("trade_timestamp", 0)
-                if trade_ts > 1000000000000:  # 毫秒
-                    trade_time = datetime.fromtimestamp(trade_ts / 1000).strftime("%Y-%m-%d %H:%M:%S")
-                elif trade_ts > 0:  # 秒
-                    trade_time = datetime.fromtimestamp(trade_ts).strftime("%Y-%m-%d %H:%M:%S")
-                else:
-                    trade_time = "N/A"
-                
-                # 统计
-                if currency not in trades_by_currency:
-                    trades_by_currency[currency] = []
-                trades_by_currency[currency].append(trade)
+                trade_time = _format_timestamp(_trade_timestamp(trade))
                 
-                if kind not in trades_by_kind:
-                    trades_by_kind[kind] = []
-                trades_by_kind[kind].append(trade)
-                
-                logger.info(f"\n[{i}] 交易详情:")
-                logger.info(f"  交易ID: {trade.get('trade_id', trade.get('trade_seq', 'N/A'))}")
-                logger.info(f"  合约: {instrument}")
-                logger.info(f"  币种: {currency} | 类型: {kind}")
-                logger.info(f"  方向: {direction} | 价格: {price:.2f} | 数量: {amount:.4f}")
-                logger.info(f"  手续费: {fee:.8f} | 交易类型: {trade_type}")
-                logger.info(f"  时间: {trade_time}")
+                logger.info(_TRADE_TEMPLATE.format(
+                    i=i,
+                    trade_id=get("trade_id", get("trade_seq", "N/A")),
+                    instrument=instrument,
+                    currency=currency,
+                    kind=kind,
+                    direction=direction,
+                    price=price,
+                    amount=amount,
+                    fee=fee,
+                    trade_type=trade_type,
+                    trade_time=trade_time
+                ))
             
-            if len(all_trades_sorted) > display_count:
-                logger.info(f"\n... 还有 {len(all_trades_sorted) - display_count} 笔交易未显示")
+            if len(all_trades) > display_count:
+                logger.info(f"\n... 还有 {len(all_trades) - display_count} 笔交易未显示")
             
             logger.info("")
             logger.info("-" * 80)
             logger.info("交易统计信息:")
             logger.info("-" * 80)
+            
+            # 统计覆盖全部交易，而不只是上面显示的最近几笔
+            trades_by_currency = Counter(trade.get("currency", "unknown") for trade in all_trades)
+            trades_by_kind = Counter(trade.get("kind", "unknown") for trade in all_trades)
+            
             logger.info(f"按币种分组:")
-            for currency, trades in trades_by_currency.items():
-                logger.info(f"  {currency}: {len(trades)} 笔交易")
+            for currency, count in trades_by_currency.most_common():
+                logger.info(f"  {currency}: {count} 笔交易")
             
             logger.info(f"\n按合约类型分组:")
-            for kind, trades in trades_by_kind.items():
-                logger.info(f"  {kind}: {len(trades)} 笔交易")
+            for kind, count in trades_by_kind.most_common():
+                logger.info(f"  {kind}: {count} 笔交易")
         else:
             logger.info("没有交易历史记录")
         
@@ -300,6 +589,42 @@ def test_get_all_orders():
 
 
 if __name__ == "__main__":
-    success = test_get_all_orders()
+    parser = argparse.ArgumentParser(description="查看 Deribit 账户所有挂单和交易历史")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="使用本地响应缓存（调试输出格式时复用最近的结果，数据可能不是最新）"
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=None,
+        help="响应缓存有效期（秒），配合 --cache 使用，默认挂单 30 秒、交易历史 300 秒"
+    )
+    parser.add_argument(
+        "--currencies",
+        type=str,
+        default=None,
+        help="查询交易历史的币种，逗号分隔（如 BTC,ETH），默认自动选择有余额的币种"
+    )
+    parser.add_argument(
+        "--export",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="把全部挂单和交易导出为 DIR 下的 orders.jsonl / trades.jsonl"
+    )
+    args = parser.parse_args()
+    
+    currencies = None
+    if args.currencies:
+        currencies = [c.strip().upper() for c in args.currencies.split(",") if c.strip()]
+    
+    success = test_get_all_orders(
+        use_cache=args.cache,
+        cache_ttl=args.cache_ttl,
+        currencies=currencies,
+        export_dir=args.export
+    )
     sys.exit(0 if success else 1)
 